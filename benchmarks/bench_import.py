@@ -0,0 +1,160 @@
+"""
+Cold-start budget check for importing som_architecture.
+
+Imports the module in fresh interpreters under `python -X importtime`, takes the median
+cumulative import time over several runs and fails (exit status 1) when it exceeds the budget
+or when a deferred dependency (autogen, openai, dotenv, ...) was imported eagerly.
+
+The budget is relative: the median is divided by the median time of importing just the
+standard library modules that som_architecture, and the som_* modules it imports eagerly, import
+at module level, measured the same way, so the check does not depend on how fast the machine is.
+--budget-ms adds an absolute limit.
+
+Usage:
+    python benchmarks/bench_import.py --runs 5 --budget-ratio 5 --output import_results.json
+"""
+
+import os
+import re
+import sys
+import ast
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Must stay out of sys.modules after `import som_architecture`
+DEFERRED_MODULES = ("autogen", "openai", "pydantic", "dotenv", "asyncio", "numpy")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Stand-in module holding only the standard library imports of som_architecture and its local modules
+BASELINE_MODULE = "som_stdlib_baseline"
+
+
+def stdlib_imports(module, seen):
+    """Module-level standard library imports of a local module and the local modules it imports"""
+    seen.add(module)
+    with open(os.path.join(ROOT, f"{module}.py"), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    lines = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)) and getattr(node, "level", 0) == 0:
+            names = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module]
+            if all(name.split(".")[0] in sys.stdlib_module_names for name in names):
+                lines.append(ast.unparse(node))
+            for name in names:
+                if name not in seen and os.path.exists(os.path.join(ROOT, f"{name}.py")):
+                    lines.extend(stdlib_imports(name, seen))
+    return lines
+
+
+def write_baseline_module():
+    """A module importing just the standard library modules som_architecture imports at module level"""
+    lines = list(dict.fromkeys(stdlib_imports("som_architecture", set())))
+    directory = tempfile.mkdtemp(prefix="som-import-baseline-")
+    with open(os.path.join(directory, f"{BASELINE_MODULE}.py"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return directory
+
+
+def import_time(python, module, cwd, probe=""):
+    """Cumulative us of importing module in a fresh interpreter, its imports' us and probe's output"""
+    completed = subprocess.run([python, "-X", "importtime", "-c", f"import {module}; {probe}"], cwd=cwd,
+                               capture_output=True, text=True, check=True)
+    # Children are printed before their parent, so collect lines until the top-level entry
+    subtree = {}
+    modules = {}
+    total = 0
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        name, cumulative = match.group(4), int(match.group(2))
+        if len(match.group(3)) > 1:
+            subtree[name] = cumulative
+            continue
+        if name == module:
+            total, modules = cumulative, subtree
+        subtree = {}
+    return total, modules, completed.stdout
+
+
+def measure_once(python):
+    """Import som_architecture in a fresh interpreter; returns (cumulative us, its imports' us, loaded deferred)"""
+    probe = f"import sys, json; print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    total, modules, output = import_time(python, "som_architecture", ROOT, probe)
+    return total, modules, json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="som_architecture import time budget")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreter imports to measure")
+    parser.add_argument("--budget-ratio", type=float, default=5.0,
+                        help="maximum median import time as a multiple of the stdlib baseline")
+    parser.add_argument("--budget-ms", type=float, help="optional maximum median import time in ms")
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports to list")
+    parser.add_argument("--python", default=sys.executable, help="interpreter to measure")
+    parser.add_argument("--output", help="optional JSON results file")
+    args = parser.parse_args(argv)
+
+    # Warm-up run so bytecode compilation is not counted
+    measure_once(args.python)
+    baseline_dir = write_baseline_module()
+    import_time(args.python, BASELINE_MODULE, baseline_dir)
+
+    totals = []
+    baselines = []
+    modules = {}
+    eager = set()
+    for _ in range(args.runs):
+        total, per_module, loaded = measure_once(args.python)
+        totals.append(total / 1000.0)
+        baselines.append(import_time(args.python, BASELINE_MODULE, baseline_dir)[0] / 1000.0)
+        eager.update(loaded)
+        for name, cumulative in per_module.items():
+            modules.setdefault(name, []).append(cumulative / 1000.0)
+
+    median_ms = statistics.median(totals)
+    baseline_ms = statistics.median(baselines)
+    ratio = median_ms / baseline_ms if baseline_ms else float("inf")
+    heaviest = sorted(((statistics.median(values), name) for name, values in modules.items()),
+                      reverse=True)[:args.top]
+
+    print(f"som_architecture import: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f})")
+    budget_ms = f", {args.budget_ms:.0f} ms" if args.budget_ms is not None else ""
+    print(f"stdlib baseline: median {baseline_ms:.1f} ms; ratio {ratio:.1f}, budget {args.budget_ratio:g}x{budget_ms}")
+    for cumulative, name in heaviest:
+        print(f"  {cumulative:8.1f} ms  {name}")
+    if eager:
+        print(f"❌ Deferred modules imported eagerly: {sorted(eager)}")
+
+    results = {
+        "benchmark": "som_import",
+        "python": args.python,
+        "runs_ms": totals,
+        "median_ms": median_ms,
+        "baseline_runs_ms": baselines,
+        "baseline_median_ms": baseline_ms,
+        "ratio": ratio,
+        "budget_ratio": args.budget_ratio,
+        "budget_ms": args.budget_ms,
+        "eager_deferred_modules": sorted(eager),
+        "heaviest_ms": {name: cumulative for cumulative, name in heaviest}
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    within_budget = (ratio <= args.budget_ratio and not eager
+                     and (args.budget_ms is None or median_ms <= args.budget_ms))
+    print("✅ Within budget" if within_budget else "❌ Over budget")
+    return 0 if within_budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Offline orchestration benchmark for the Society of Mind workflow.
+
+Runs complete SoM pipelines (inner teams followed by outer coordination) against the local
+FakeLLMServer, so results reflect orchestration overhead rather than provider latency. Every
+human gate is auto-approved through an ApprovalBroker rule.
+
+Usage:
+    python benchmarks/bench_workflows.py --teams 2,4 --max-rounds 4,8 --concurrency 1,4 \
+        --workflows 20 --latency-ms 5 --output bench_results.json
+
+Each (teams, max_round, concurrency) combination is measured separately and written to the
+output file as JSON, together with the commit and library versions, for comparison between
+commits.
+
+With --backend process, concurrent workflows run one per worker process of a
+WorkflowProcessPool instead of on threads. Workers are warmed up with one workflow each before
+timing starts.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import som_architecture as som
+from fake_llm import FakeLLMServer
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size of this process (or its largest finished child) in MiB"""
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def team_tasks(team_count, workflow_index):
+    """Alternate research and development teams"""
+    tasks = {}
+    for i in range(team_count):
+        kind = "Research" if i % 2 == 0 else "Development"
+        tasks[f"{kind}_Team_{i}"] = f"Benchmark {kind.lower()} task {workflow_index}"
+    return tasks
+
+
+def run_case(config_list, broker, teams, max_round, concurrency, workflows):
+    """Run one benchmark case and return its measurements"""
+    metrics = som.WorkflowMetrics()
+    latencies = []
+    inner_times = []
+    outer_times = []
+
+    def run_one(index):
+        architecture = som.SoMArchitecture(config_list, max_concurrency=teams, approval_broker=broker,
+                                           metrics=metrics, max_round=max_round)
+        started = time.perf_counter()
+        outcome = architecture.run_pipeline(team_tasks(teams, index), "Benchmark coordination task")
+        latencies.append(time.perf_counter() - started)
+        inner_times.append(max(result["duration"] for result in outcome["inner_teams"].values()))
+        outer_times.append(outcome["coordination"]["duration"])
+        failed = [name for name, result in outcome["inner_teams"].items() if result["status"] != "completed"]
+        if failed or outcome["coordination"]["status"] != "completed":
+            raise RuntimeError(f"workflow {index} failed: {outcome}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_one, range(workflows)))
+    elapsed = time.perf_counter() - started
+
+    return summarize(teams, max_round, concurrency, workflows, elapsed, metrics, latencies,
+                     inner_times, outer_times)
+
+
+def run_case_processes(config_list, broker, teams, max_round, concurrency, workflows):
+    """Run one benchmark case on a WorkflowProcessPool with one worker per concurrent workflow"""
+    metrics = som.WorkflowMetrics()
+    manager = som.SoMWorkflowManager(config_list, approval_broker=broker, metrics=metrics)
+
+    def spec(index):
+        return {"teams": team_tasks(teams, index), "coordination_task": "Benchmark coordination task",
+                "max_round": max_round}
+
+    with manager.process_pool(concurrency) as pool:
+        # One workflow per worker builds its teams before the clock starts
+        warmups = [pool.submit(f"warmup-{i}", spec(-1 - i)) for i in range(concurrency)]
+        for future in warmups:
+            future.result()
+        warm_metrics = metrics.snapshot()
+
+        started = time.perf_counter()
+        futures = [pool.submit(str(i), spec(i)) for i in range(workflows)]
+        records = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+    failed = [record for record in records if record["status"] != "completed"]
+    if failed:
+        raise RuntimeError(f"workflow {failed[0]['task_id']} failed: {failed[0]}")
+    measured = som.WorkflowMetrics()
+    measured.merge(metrics.snapshot())
+    for key, value in warm_metrics["counters"].items():
+        measured.counters[key] -= value
+    for key, histogram in warm_metrics["histograms"].items():
+        measured.histograms[key]["sum"] -= histogram["sum"]
+        measured.histograms[key]["count"] -= histogram["count"]
+
+    latencies = [record["duration"] for record in records]
+    inner_times = [max(result["duration"] for result in record["inner_teams"].values()) for record in records]
+    outer_times = [record["coordination"]["duration"] for record in records]
+    case = summarize(teams, max_round, concurrency, workflows, elapsed, measured, latencies,
+                     inner_times, outer_times)
+    case["worker_peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return case
+
+
+def summarize(teams, max_round, concurrency, workflows, elapsed, metrics, latencies, inner_times, outer_times):
+    """Measurements of one case"""
+    phases = {}
+    selections_saved = 0
+    rounds_saved = 0
+    for entry in metrics.summary().values():
+        selections_saved += int(entry.get("som_speaker_selections_saved_total", 0))
+        rounds_saved += int(entry.get("som_rounds_saved_total", 0))
+        for name, value in entry.items():
+            if name.endswith("_seconds"):
+                phases[name] = phases.get(name, 0.0) + value
+
+    return {
+        "teams": teams,
+        "max_round": max_round,
+        "concurrency": concurrency,
+        "workflows": workflows,
+        "elapsed_seconds": elapsed,
+        "workflows_per_second": workflows / elapsed if elapsed else 0.0,
+        "latency_p50_seconds": percentile(latencies, 50),
+        "latency_p99_seconds": percentile(latencies, 99),
+        "latency_mean_seconds": statistics.mean(latencies),
+        "inner_phase_mean_seconds": statistics.mean(inner_times),
+        "outer_phase_mean_seconds": statistics.mean(outer_times),
+        "phase_totals_seconds": phases,
+        "speaker_selections_saved": selections_saved,
+        "rounds_saved": rounds_saved,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def parse_ints(value):
+    return [int(part) for part in value.split(",") if part]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline SoM orchestration benchmark")
+    parser.add_argument("--teams", type=parse_ints, default=[2], help="comma-separated inner team counts")
+    parser.add_argument("--max-rounds", type=parse_ints, default=[8], help="comma-separated max_round values")
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 4], help="comma-separated concurrent workflows")
+    parser.add_argument("--workflows", type=int, default=10, help="workflows per case")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake LLM latency per call")
+    parser.add_argument("--completion-tokens", type=int, default=50, help="fake LLM reply length in tokens")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--backend", choices=("thread", "process"), default="thread",
+                        help="run concurrent workflows on threads or on worker processes")
+    parser.add_argument("--verbose", action="store_true", help="keep the agents' chat output")
+    args = parser.parse_args(argv)
+
+    server = FakeLLMServer(latency=args.latency_ms / 1000.0,
+                            completion_tokens=args.completion_tokens).start()
+    broker = som.ApprovalBroker()
+    broker.add_rule(r".*", "APPROVE")
+
+    # The fake server's config list turns AutoGen's ./.cache off; each case also gets its own
+    # working directory, so no case can replay replies recorded by an earlier one
+    output = os.path.abspath(args.output)
+    previous_cwd = os.getcwd()
+
+    cases = []
+    try:
+        for teams in args.teams:
+            for max_round in args.max_rounds:
+                for concurrency in args.concurrency:
+                    os.chdir(tempfile.mkdtemp(prefix="som-bench-"))
+                    som.team_registry.clear()
+                    sink = contextlib.nullcontext() if args.verbose else open(os.devnull, "w")
+                    with sink as devnull, contextlib.redirect_stdout(devnull or sys.stdout):
+                        run = run_case_processes if args.backend == "process" else run_case
+                        case = run(server.config_list(), broker, teams, max_round,
+                                   concurrency, args.workflows)
+                    case["backend"] = args.backend
+                    cases.append(case)
+                    print(f"teams={teams} max_round={max_round} concurrency={concurrency}: "
+                          f"{case['workflows_per_second']:.2f} wf/s, "
+                          f"p50 {case['latency_p50_seconds'] * 1000:.0f} ms, "
+                          f"p99 {case['latency_p99_seconds'] * 1000:.0f} ms, "
+                          f"peak RSS {case['peak_rss_mb']:.0f} MiB")
+    finally:
+        server.stop()
+        os.chdir(previous_cwd)
+
+    results = {
+        "benchmark": "som_workflows",
+        "timestamp": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "autogen": getattr(som.autogen, "__version__", None) if som.AUTOGEN_AVAILABLE else None,
+        "fake_llm": {"latency_ms": args.latency_ms, "completion_tokens": args.completion_tokens,
+                     "requests": server.requests},
+        "cases": cases
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Local, deterministic OpenAI-compatible endpoint for the offline benchmarks and tests.
+
+Not part of som_architecture: production code never talks to it. Point a config list at it with
+FakeLLMServer(...).start().config_list().
+"""
+
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
+
+
+class FakeLLMServer:
+    """
+    Local, deterministic OpenAI-compatible chat completions endpoint for offline runs.
+
+    Serves POST .../chat/completions on 127.0.0.1 with a fixed latency and token count. Speaker
+    selection prompts are answered with one of the listed roles, chosen by conversation length;
+    other prompts get the next entry of the first reply script whose regex matches the system
+    message, or a generated reply of completion_tokens words. Requests with "stream": true are
+    answered as server-sent chat.completion.chunk events, one per word. With error_every=N,
+    every Nth request is answered with a 429 to exercise client retries.
+    """
+
+    def __init__(self, latency: float = 0.0, completion_tokens: int = 50,
+                 reply_scripts: Optional[Dict[str, List[str]]] = None, port: int = 0,
+                 error_every: int = 0):
+        self.latency = latency
+        self.error_every = error_every
+        self.completion_tokens = completion_tokens
+        self.reply_scripts = [(re.compile(pattern), replies)
+                              for pattern, replies in (reply_scripts or {}).items()]
+        self.port = port
+        self.requests = 0
+        self._script_positions = defaultdict(int)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def config_list(self, model: str = "fake-gpt") -> List[Dict]:
+        """Config list pointing AutoGen agents at this server, with AutoGen's disk cache off"""
+        # With the default cache_seed, runs sharing a working directory replay each other's replies
+        return [{"model": model, "api_key": "sk-fake-local", "base_url": self.base_url, "price": [0, 0],
+                 "cache_seed": None}]
+
+    def start(self) -> "FakeLLMServer":
+        """Start serving in a daemon thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        fake = self
+
+        class CompletionHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                status, response = fake.respond(body)
+                if status == 200 and body.get("stream"):
+                    return self.send_stream(response)
+                payload = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_stream(self, response):
+                # Server-sent events without a length, so the connection ends the response
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for chunk in fake.stream_chunks(response):
+                    self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), CompletionHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="som-fake-llm", daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def respond(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """HTTP status and JSON body for a request, injecting rate-limit errors when configured"""
+        with self._lock:
+            self.requests += 1
+            throttled = self.error_every and self.requests % self.error_every == 0
+        if throttled:
+            return 429, {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_exceeded"}}
+        return 200, self.complete(body)
+
+    def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a chat completion response for a request body"""
+        messages = body.get("messages", [])
+        text = "\n".join(str(m.get("content") or "") for m in messages)
+        system = str(messages[0].get("content") or "") if messages else ""
+        content = self._select_role(text, len(messages))
+        if content is None:
+            content = self._scripted_reply(system, len(messages))
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        prompt_tokens = max(1, len(text) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        return {
+            "id": f"fake-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-gpt"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def stream_chunks(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Split a chat completion into word-sized chat.completion.chunk objects"""
+        content = response["choices"][0]["message"]["content"]
+        base = {"id": response["id"], "object": "chat.completion.chunk",
+                "created": response["created"], "model": response["model"]}
+        deltas = [{"role": "assistant", "content": ""}]
+        deltas += [{"content": piece} for piece in re.findall(r"\S+\s*", content)]
+        chunks = [{**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]} for delta in deltas]
+        chunks.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        return chunks
+
+    def _select_role(self, text: str, turn: int) -> Optional[str]:
+        match = re.search(r"select the next role from \[([^\]]*)\]", text)
+        if not match:
+            return None
+        roles = [role.strip(" '\"") for role in match.group(1).split(",") if role.strip()]
+        return roles[turn % len(roles)] if roles else None
+
+    def _scripted_reply(self, system: str, turn: int) -> str:
+        for pattern, replies in self.reply_scripts:
+            if replies and pattern.search(system):
+                with self._lock:
+                    position = self._script_positions[pattern.pattern]
+                    self._script_positions[pattern.pattern] += 1
+                return replies[position % len(replies)]
+        seed = hashlib.sha256(f"{system}|{turn}".encode("utf-8")).hexdigest()
+        words = [seed[i % len(seed):][:6] for i in range(self.completion_tokens)]
+        return "Analysis: " + " ".join(words)
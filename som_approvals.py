@@ -0,0 +1,235 @@
+"""
+Human gate routing for SoM teams: auto-approval rules, callbacks, a watched file and a socket.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from contextlib import nullcontext
+from typing import Dict, List, Any, Optional
+
+
+class ApprovalRequest:
+    """A human gate parked until a decision arrives"""
+    
+    def __init__(self, team: str, agent: str, prompt: str, message: str, timeout: Optional[float]):
+        self.gate_id = f"{team}:{uuid.uuid4().hex[:8]}"
+        self.team = team
+        self.agent = agent
+        self.prompt = prompt
+        self.message = message
+        self.timeout = timeout
+        self.created = time.time()
+        self.decision = None
+        self.decided_by = None
+        self._event = threading.Event()
+        self._future = None
+        self._loop = None
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "gate_id": self.gate_id,
+            "team": self.team,
+            "agent": self.agent,
+            "message": self.message,
+            "created": self.created,
+            "timeout": self.timeout
+        }
+
+
+class ApprovalBroker:
+    """
+    Routes human gates to asynchronous decision sources instead of blocking on stdin
+    Gates are decided by rules, submit(), a watched JSONL file or the socket server, else by timeout
+    """
+    
+    def __init__(self, default_timeout: Optional[float] = None, timeout_decision: str = "REJECT",
+                 on_request=None):
+        self.default_timeout = default_timeout
+        self.timeout_decision = timeout_decision
+        self.on_request = on_request
+        self.rules = []
+        self.rule_patterns = []
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = None
+        self.stats = {"requested": 0, "auto_decided": 0, "decided": 0, "timed_out": 0}
+        
+    def add_rule(self, match, decision: str, team: Optional[str] = None):
+        """Auto-decide gates whose message matches a regex (or predicate), optionally for one team"""
+        if isinstance(match, str):
+            self.rule_patterns.append((match, decision, team))
+            pattern = re.compile(match, re.IGNORECASE)
+            match = lambda request: bool(pattern.search(request.message or request.prompt))
+        self.rules.append((match, decision, team))
+        
+    def pending(self) -> List[Dict[str, Any]]:
+        """Describe every gate still waiting for a decision"""
+        with self._lock:
+            return [request.to_dict() for request in self._pending.values()]
+            
+    def submit(self, gate_id: str, decision: str, decided_by: str = "callback") -> bool:
+        """Resolve a pending gate; returns False for unknown or already decided gates"""
+        with self._lock:
+            request = self._pending.pop(gate_id, None)
+            if request is None:
+                return False
+            self.stats["decided"] += 1
+        self._resolve(request, decision, decided_by)
+        return True
+        
+    def request(self, team: str, agent: str, prompt: str, message: str = "",
+                timeout: Optional[float] = None) -> str:
+        """Block the calling thread until the gate is decided; sync chats hold a thread per parked gate"""
+        request = self._open(team, agent, prompt, message, timeout)
+        if request.decision is None:
+            if not request._event.wait(request.timeout):
+                self._expire(request)
+        return request.decision
+        
+    async def a_request(self, team: str, agent: str, prompt: str, message: str = "",
+                        timeout: Optional[float] = None) -> str:
+        """Await the gate decision on the running event loop"""
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        request = ApprovalRequest(team, agent, prompt, message,
+                                  timeout if timeout is not None else self.default_timeout)
+        request._loop = loop
+        request._future = loop.create_future()
+        self._park(request)
+        if request.decision is None:
+            try:
+                await asyncio.wait_for(asyncio.shield(request._future), request.timeout)
+            except asyncio.TimeoutError:
+                self._expire(request)
+        return request.decision
+        
+    def watch_file(self, path: str, poll_interval: float = 0.5) -> threading.Thread:
+        """Tail a JSONL file of {"gate_id": ..., "decision": ...} lines in a background thread"""
+        def tail():
+            offset = 0
+            while not self._stopped.is_set():
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        f.seek(offset)
+                        for line in iter(f.readline, ""):
+                            if not line.endswith("\n"):
+                                break  # Wait for the writer to finish the line
+                            offset = f.tell()
+                            try:
+                                entry = json.loads(line)
+                                self.submit(entry["gate_id"], entry["decision"], decided_by=f"file:{path}")
+                            except (ValueError, KeyError):
+                                print(f"⚠️ Ignoring malformed approval line: {line.strip()}")
+                self._stopped.wait(poll_interval)
+                
+        thread = threading.Thread(target=tail, name="som-approval-file", daemon=True)
+        thread.start()
+        return thread
+        
+    def serve(self, host: str = "127.0.0.1", port: int = 0):
+        """Accept "<gate_id> <decision>" lines over TCP ("PENDING" lists open gates); returns the bound address"""
+        import socketserver
+        
+        broker = self
+        
+        class DecisionHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    line = raw.decode("utf-8").strip()
+                    if line.upper() == "PENDING":
+                        reply = json.dumps(broker.pending())
+                    else:
+                        gate_id, _, decision = line.partition(" ")
+                        accepted = decision and broker.submit(gate_id, decision, decided_by="socket")
+                        reply = "OK" if accepted else "UNKNOWN"
+                    self.wfile.write((reply + "\n").encode("utf-8"))
+                    
+        self._server = socketserver.ThreadingTCPServer((host, port), DecisionHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="som-approval-socket",
+                         daemon=True).start()
+        return self._server.server_address
+        
+    def stop(self):
+        """Stop the file watcher and socket server"""
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            
+    def _open(self, team, agent, prompt, message, timeout) -> ApprovalRequest:
+        request = ApprovalRequest(team, agent, prompt, message,
+                                  timeout if timeout is not None else self.default_timeout)
+        self._park(request)
+        return request
+        
+    def _park(self, request: ApprovalRequest):
+        with self._lock:
+            self.stats["requested"] += 1
+        for match, decision, team in self.rules:
+            if (team is None or team == request.team) and match(request):
+                with self._lock:
+                    self.stats["auto_decided"] += 1
+                self._resolve(request, decision, "policy")
+                return
+                
+        with self._lock:
+            self._pending[request.gate_id] = request
+        print(f"⏸️ Human gate {request.gate_id} parked for {request.agent}")
+        if self.on_request is not None:
+            self.on_request(request)
+            
+    def _expire(self, request: ApprovalRequest):
+        with self._lock:
+            if self._pending.pop(request.gate_id, None) is None:
+                return  # Decided while we were timing out
+            self.stats["timed_out"] += 1
+        print(f"⏱️ Human gate {request.gate_id} timed out, using '{self.timeout_decision}'")
+        self._resolve(request, self.timeout_decision, "timeout")
+        
+    def _resolve(self, request: ApprovalRequest, decision: str, decided_by: str):
+        request.decision = decision
+        request.decided_by = decided_by
+        request._event.set()
+        if request._future is not None:
+            request._loop.call_soon_threadsafe(
+                lambda: request._future.done() or request._future.set_result(decision)
+            )
+
+
+def install_approval_gate(agent, team: str):
+    """Route the human proxy's input through the bound ApprovalBroker, falling back to stdin"""
+    stdin_input = agent.get_human_input
+    a_stdin_input = agent.a_get_human_input
+    
+    def last_message() -> str:
+        message = agent.last_message() if len(agent.chat_messages) == 1 else None
+        return str((message or {}).get("content") or "")
+        
+    def gate_timer():
+        metrics = getattr(agent, "_som_runtime", {}).get("metrics")
+        return metrics.span("human_gate", team, agent.name) if metrics else nullcontext()
+        
+    def get_human_input(prompt: str) -> str:
+        broker = getattr(agent, "_som_runtime", {}).get("approval_broker")
+        with gate_timer():
+            if broker is None:
+                return stdin_input(prompt)
+            return broker.request(team, agent.name, prompt, last_message())
+            
+    async def a_get_human_input(prompt: str) -> str:
+        broker = getattr(agent, "_som_runtime", {}).get("approval_broker")
+        with gate_timer():
+            if broker is None:
+                return await a_stdin_input(prompt)
+            return await broker.a_request(team, agent.name, prompt, last_message())
+        
+    agent.get_human_input = get_human_input
+    agent.a_get_human_input = a_get_human_input
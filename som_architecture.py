@@ -7,58 +7,1988 @@ within the Society of Mind framework.
 """
 
 import os
+import copy
+import re
 import json
 import time
+import sqlite3
+import queue
+import hashlib
+import importlib
+import importlib.util
+import threading
+import contextvars
+import zlib
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
-from typing import Dict, List, Any, Optional
-from dotenv import load_dotenv
+from typing import Dict, List, Any, Optional, Tuple
 
-# Load environment variables
-load_dotenv()
+from som_cache import ResponseCache, ResponseCacheMiss, CheckpointStore
+from som_approvals import ApprovalBroker, install_approval_gate
+from som_providers import ProviderPool
 
-try:
-    import autogen
-    AUTOGEN_AVAILABLE = True
-except ImportError:
-    AUTOGEN_AVAILABLE = False
+
+class _LazyModule:
+    """Stand-in for a module that is imported on first attribute access"""
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# AutoGen (and the openai/pydantic stack behind it) is only imported once a team is built
+autogen = _LazyModule("autogen")
+asyncio = _LazyModule("asyncio")
+numpy = _LazyModule("numpy")
+
+AUTOGEN_AVAILABLE = importlib.util.find_spec("autogen") is not None
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+if not AUTOGEN_AVAILABLE:
     print("AutoGen not available. Running in demo mode.")
 
+_environment_loaded = False
+
+
+def load_environment():
+    """Load .env into the process environment (once); called before reading configuration"""
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
+
+
+def config_fingerprint(config_list: List[Dict]) -> str:
+    """Stable short hash of a config_list, used to key cached teams"""
+    payload = json.dumps(config_list, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class PooledTeam:
+    """Agent roster with its GroupChat/GroupChatManager pair, reused across workflows"""
+    
+    def __init__(self, key: tuple, agents: Dict[str, Any], group_chat, chat_manager):
+        self.key = key
+        self.agents = agents
+        self.group_chat = group_chat
+        self.chat_manager = chat_manager
+        self.last_used = time.monotonic()
+        self.runs = 0
+        self.runtime = {}
+        
+    def bind(self, **runtime):
+        """Attach per-workflow runtime services (response cache, ...) to every agent"""
+        self.runtime = runtime
+        for agent in self.agents.values():
+            agent._som_runtime = runtime
+        self.chat_manager._som_runtime = runtime
+        
+    def usage(self) -> Dict[str, int]:
+        """Prompt/completion tokens spent so far by the agents and the chat manager"""
+        totals = {"prompt_tokens": 0, "completion_tokens": 0}
+        for agent in list(self.agents.values()) + [self.chat_manager]:
+            for field, value in _agent_usage(agent).items():
+                totals[field] += value
+        return totals
+        
+    def reset(self):
+        """Clear chat history left over from the previous workflow"""
+        for agent in self.agents.values():
+            agent.reset()
+        self.group_chat.reset()
+        self.chat_manager.reset()
+
+
+class TeamRegistry:
+    """
+    Keyed pool of constructed teams, leased to one workflow at a time
+    Idle teams are evicted least-recently-used first and after ttl seconds without use
+    """
+    
+    def __init__(self, max_idle: int = 16, ttl: Optional[float] = 900.0):
+        self.max_idle = max_idle
+        self.ttl = ttl
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.reuses = 0
+        self.evictions = 0
+        
+    def acquire(self, key: tuple, builder) -> PooledTeam:
+        """Lease a team for key, building it with builder() on a miss"""
+        team = None
+        with self._lock:
+            self._evict_expired()
+            idle = self._idle.get(key)
+            if idle:
+                team = idle.pop()
+                if not idle:
+                    del self._idle[key]
+                self.reuses += 1
+                
+        if team is None:
+            team = builder()
+            with self._lock:
+                self.builds += 1
+        else:
+            team.reset()
+            
+        team.runs += 1
+        return team
+        
+    def release(self, team: PooledTeam):
+        """Return a leased team to the idle pool"""
+        team.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(team.key, []).append(team)
+            self._idle.move_to_end(team.key)
+            while self._idle_count() > self.max_idle:
+                oldest_key = next(iter(self._idle))
+                self._idle[oldest_key].pop(0)
+                if not self._idle[oldest_key]:
+                    del self._idle[oldest_key]
+                self.evictions += 1
+                
+    def clear(self):
+        """Drop every idle team"""
+        with self._lock:
+            self.evictions += self._idle_count()
+            self._idle.clear()
+            
+    def stats(self) -> Dict[str, int]:
+        """Return build/reuse/eviction counters"""
+        with self._lock:
+            return {
+                "builds": self.builds,
+                "reuses": self.reuses,
+                "evictions": self.evictions,
+                "idle_teams": self._idle_count()
+            }
+            
+    def _idle_count(self) -> int:
+        return sum(len(teams) for teams in self._idle.values())
+        
+    def _evict_expired(self):
+        if self.ttl is None:
+            return
+        cutoff = time.monotonic() - self.ttl
+        for key in list(self._idle):
+            fresh = [team for team in self._idle[key] if team.last_used >= cutoff]
+            self.evictions += len(self._idle[key]) - len(fresh)
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+
+# Process-wide team pool shared by every team manager
+team_registry = TeamRegistry()
+
+
+class TeamSpec:
+    """
+    Validated definition of one team type: agents, human gate, speaker graph and intervention points
+    Agents are only instantiated by build_agents(), when a team of this type is scheduled
+    """
+    
+    KINDS = ("assistant", "human", "team")
+    LEVELS = ("inner", "outer")
+    
+    def __init__(self, team_type: str, agents: Dict[str, Dict[str, str]], gate: str,
+                 speaker_graph: Optional[Dict[str, List[str]]] = None, name_patterns: List[str] = (),
+                 intervention_points: List[str] = (), level: str = "inner", terminal_roles: List[str] = ()):
+        self.team_type = team_type
+        self.gate = gate
+        self.level = level
+        self.speaker_graph = speaker_graph or {}
+        self.terminal_roles = list(terminal_roles)
+        self.intervention_points = list(intervention_points)
+        self.name_patterns = [re.compile(pattern) for pattern in name_patterns]
+        self.agents = OrderedDict(
+            (role, (agent.get("kind", "assistant"), agent["name"], agent.get("system_message", ""),
+                    agent.get("team_type")))
+            for role, agent in agents.items()
+        )
+        self._validate()
+        
+    @classmethod
+    def from_dict(cls, team_type: str, data: Dict[str, Any]) -> "TeamSpec":
+        try:
+            return cls(team_type, **data)
+        except (TypeError, KeyError) as e:
+            raise ValueError(f"Invalid spec for team type '{team_type}': {e}") from e
+            
+    def _validate(self):
+        problems = []
+        if not self.agents:
+            problems.append("no agents")
+        if self.level not in self.LEVELS:
+            problems.append(f"level must be one of {self.LEVELS}")
+        for role, (kind, name, system_message, team_type) in self.agents.items():
+            if kind not in self.KINDS:
+                problems.append(f"agent '{role}' has unknown kind '{kind}'")
+            if not name or not isinstance(system_message, str) or (kind != "team" and not system_message):
+                problems.append(f"agent '{role}' needs a name and a system_message")
+            if (kind == "team") != bool(team_type):
+                problems.append(f"agent '{role}' needs a team_type exactly when its kind is 'team'")
+        if self.agents.get(self.gate, ("",))[0] != "human":
+            problems.append(f"gate '{self.gate}' must be a human agent role")
+        for role, successors in self.speaker_graph.items():
+            for unknown in {role, *successors} - set(self.agents):
+                problems.append(f"speaker graph refers to unknown role '{unknown}'")
+        for unknown in set(self.terminal_roles) - set(self.agents):
+            problems.append(f"terminal role '{unknown}' is not an agent role")
+        for role in SpeakerGraph.dead_ends(self.speaker_graph, self.agents, self.terminal_roles):
+            problems.append(f"speaker graph role '{role}' has no successors; list it in terminal_roles")
+        if problems:
+            raise ValueError(f"Invalid spec for team type '{self.team_type}': " + "; ".join(problems))
+            
+    def matches(self, team_name: str) -> bool:
+        return any(pattern.search(team_name) for pattern in self.name_patterns)
+        
+    def nested_team_types(self) -> List[str]:
+        return [team_type for kind, _, _, team_type in self.agents.values() if kind == "team"]
+        
+    def build_agents(self, team_name: str, config_list: List[Dict],
+                     specs: Optional["TeamSpecRegistry"] = None) -> Dict[str, Any]:
+        """Instantiate this team's agents for one team name"""
+        agents = {}
+        for role, (kind, name, system_message, team_type) in self.agents.items():
+            name = name.format(team_name=team_name)
+            system_message = system_message.format(team_name=team_name)
+            if kind == "team":
+                nested = InnerTeamManager(name, config_list, team_type=team_type, specs=specs)
+                agents[role] = create_team_agent(nested, name, system_message or None)
+            elif kind == "human":
+                agents[role] = autogen.UserProxyAgent(
+                    name=name,
+                    system_message=system_message,
+                    human_input_mode="ALWAYS",
+                    max_consecutive_auto_reply=0,
+                    code_execution_config=False
+                )
+            else:
+                agents[role] = autogen.AssistantAgent(
+                    name=name,
+                    system_message=system_message,
+                    llm_config={"config_list": config_list}
+                )
+        return agents
+
+
+class TeamSpecRegistry:
+    """
+    Team types loaded from JSON (or YAML) spec files: the bundled teams.json plus SOM_TEAM_SPECS
+    Specs are loaded and validated on first use; later files override team types of the same name
+    """
+    
+    DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "teams.json")
+    
+    def __init__(self, paths: Optional[List[str]] = None):
+        self.paths = paths
+        self.default_team_type = None
+        self._specs = OrderedDict()
+        self._loaded = False
+        self._lock = threading.Lock()
+        
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded:
+                return
+            paths = self.paths
+            if paths is None:
+                load_environment()
+                extra = os.getenv("SOM_TEAM_SPECS", "")
+                paths = [self.DEFAULT_PATH] + [path for path in extra.split(os.pathsep) if path]
+            for path in paths:
+                self._load(path)
+            self._check_nesting()
+            self._loaded = True
+            
+    def __getstate__(self) -> Dict[str, Any]:
+        # Shipped to worker processes fully loaded, so they see programmatically registered specs
+        self._ensure_loaded()
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+        
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        
+    def load(self, path: str) -> "TeamSpecRegistry":
+        """Load an additional spec file"""
+        self._ensure_loaded()
+        with self._lock:
+            specs, default_team_type = OrderedDict(self._specs), self.default_team_type
+            try:
+                self._load(path)
+                self._check_nesting()
+            except Exception:
+                # A rejected file leaves the registry as it was
+                self._specs, self.default_team_type = specs, default_team_type
+                raise
+        return self
+        
+    def _load(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith((".yaml", ".yml")):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError(f"PyYAML is required to load {path}; install it or use JSON")
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        specs = [TeamSpec.from_dict(team_type, spec) for team_type, spec in data.get("teams", {}).items()]
+        for spec in specs:
+            self._specs[spec.team_type] = spec
+        self.default_team_type = data.get("default_team_type", self.default_team_type)
+        
+    def register(self, spec: TeamSpec):
+        self._ensure_loaded()
+        with self._lock:
+            self._specs[spec.team_type] = spec
+            self._check_nesting()
+            
+    def _check_nesting(self):
+        """Nested "team" agents must refer to known inner team types, without cycles"""
+        def visit(team_type: str, path: Tuple[str, ...]):
+            if team_type in path:
+                raise ValueError(f"Team types nest cyclically: {' -> '.join(path + (team_type,))}")
+            if team_type not in self._specs or self._specs[team_type].level != "inner":
+                raise ValueError(f"Team type '{path[-1]}' nests unknown inner team type '{team_type}'")
+            for nested in self._specs[team_type].nested_team_types():
+                visit(nested, path + (team_type,))
+                
+        for spec in self._specs.values():
+            for nested in spec.nested_team_types():
+                visit(nested, (spec.team_type,))
+            
+    def get(self, team_type: str) -> TeamSpec:
+        self._ensure_loaded()
+        if team_type not in self._specs:
+            raise KeyError(f"Unknown team type '{team_type}'; known types: {sorted(self._specs)}")
+        return self._specs[team_type]
+        
+    def resolve(self, team_name: str, level: str = "inner") -> TeamSpec:
+        """Spec whose name_patterns match team_name, else the default team type"""
+        self._ensure_loaded()
+        for spec in self._specs.values():
+            if spec.level == level and spec.matches(team_name):
+                return spec
+        if self.default_team_type is None:
+            raise KeyError(f"No team type matches '{team_name}' and no default_team_type is set")
+        return self.get(self.default_team_type)
+        
+    def team_types(self) -> List[str]:
+        self._ensure_loaded()
+        return list(self._specs)
+
+
+# Process-wide team spec registry, loaded on first use
+team_specs = TeamSpecRegistry()
+
+
+class WorkflowMetrics:
+    """
+    Per-agent, per-round latency and token instrumentation
+    Exported as Prometheus text, a Chrome trace or collapsed stacks for flamegraph.pl
+    """
+    
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+    
+    def __init__(self, max_spans: int = 100000):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add value to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += value
+            
+    def observe(self, name: str, value: float, **labels):
+        """Record value in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"buckets": [0] * len(self.BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            
+    @contextmanager
+    def span(self, phase: str, team: str, agent: str, **attributes):
+        """Time a block as one phase of a team round"""
+        started = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            duration = time.perf_counter() - started
+            self.observe(f"som_{phase}_seconds", duration, team=team, agent=agent)
+            with self._lock:
+                self.spans.append((phase, team, agent, started - self._origin, duration,
+                                   threading.get_ident(), attributes))
+                
+    def snapshot(self) -> Dict[str, Any]:
+        """Picklable copy of the counters and histograms (spans stay local), for merge()"""
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "histograms": {key: {"buckets": list(histogram["buckets"]), "sum": histogram["sum"],
+                                         "count": histogram["count"]}
+                                   for key, histogram in self.histograms.items()}}
+                                   
+    def merge(self, snapshot: Dict[str, Any]):
+        """Add another process's snapshot() into these metrics"""
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] += value
+            for key, other in snapshot["histograms"].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = {"buckets": [0] * len(self.BUCKETS), "sum": 0.0, "count": 0}
+                histogram["buckets"] = [a + b for a, b in zip(histogram["buckets"], other["buckets"])]
+                histogram["sum"] += other["sum"]
+                histogram["count"] += other["count"]
+                
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Total time, calls and counters per team/agent"""
+        result = defaultdict(lambda: defaultdict(float))
+        with self._lock:
+            for (name, labels), histogram in self.histograms.items():
+                label_map = dict(labels)
+                entry = result[f"{label_map.get('team')}/{label_map.get('agent')}"]
+                phase = name[len("som_"):-len("_seconds")]
+                entry[f"{phase}_seconds"] += histogram["sum"]
+                entry[f"{phase}_calls"] += histogram["count"]
+            for (name, labels), value in self.counters.items():
+                label_map = dict(labels)
+                result[f"{label_map.get('team')}/{label_map.get('agent')}"][name] += value
+        return {key: dict(value) for key, value in result.items()}
+        
+    def to_prometheus(self) -> str:
+        """Render counters and histograms in the Prometheus text exposition format"""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+            
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{fmt(labels)} {value:g}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(self.BUCKETS, histogram["buckets"]):
+                        lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {histogram['count']}")
+                    lines.append(f"{name}_sum{fmt(labels)} {histogram['sum']:.6f}")
+                    lines.append(f"{name}_count{fmt(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+        
+    def write_trace(self, path: str):
+        """Write spans as Chrome trace events (one process track per team)"""
+        with self._lock:
+            spans = list(self.spans)
+        events = [{
+            "name": f"{agent}:{phase}",
+            "cat": phase,
+            "ph": "X",
+            "ts": started * 1e6,
+            "dur": duration * 1e6,
+            "pid": team,
+            "tid": thread_id,
+            "args": attributes
+        } for phase, team, agent, started, duration, thread_id, attributes in spans]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+            
+    def write_collapsed(self, path: str):
+        """Write spans as collapsed stacks (team;agent;phase microseconds) for flamegraph.pl"""
+        totals = defaultdict(float)
+        with self._lock:
+            for phase, team, agent, _, duration, _, _ in self.spans:
+                totals[f"{team};{agent};{phase}"] += duration
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, seconds in sorted(totals.items()):
+                f.write(f"{stack} {int(seconds * 1e6)}\n")
+
+
+def _usage_tokens(client) -> Dict[str, int]:
+    """Prompt/completion token totals from an OpenAIWrapper usage summary"""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0}
+    summary = getattr(client, "total_usage_summary", None) or {}
+    for usage in summary.values():
+        if isinstance(usage, dict):
+            for field in totals:
+                totals[field] += usage.get(field, 0)
+    return totals
+
+
+def _agent_usage(agent) -> Dict[str, int]:
+    """Token totals of an agent's LLM client plus its streaming client, if it has one"""
+    totals = _usage_tokens(getattr(agent, "client", None))
+    for field, value in _usage_tokens(getattr(agent, "_som_stream_client", None)).items():
+        totals[field] += value
+    return totals
+
+
+class AuditRecord:
+    """One compact audit log entry"""
+    
+    __slots__ = ("timestamp", "team", "action", "level", "task", "detail")
+    
+    def __init__(self, team: str, action: str, level: str = "inner_team", task: str = "",
+                 detail: Optional[Dict[str, Any]] = None, timestamp: Optional[str] = None):
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.team = team
+        self.action = action
+        self.level = level
+        self.task = task
+        self.detail = detail
+        
+    def to_dict(self) -> Dict[str, Any]:
+        entry = {
+            "timestamp": self.timestamp,
+            "team": self.team,
+            "action": self.action,
+            "level": self.level,
+            "task": self.task
+        }
+        if self.detail:
+            entry["detail"] = self.detail
+        return entry
+
+
+class JsonlAuditSink:
+    """Appends audit records to a JSONL file"""
+    
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        
+    def write(self, records: List[AuditRecord]):
+        self._file.write("".join(json.dumps(r.to_dict(), default=str) + "\n" for r in records))
+        self._file.flush()
+        
+    def close(self):
+        self._file.close()
+
+
+class SQLiteAuditSink:
+    """Inserts audit records into a SQLite table"""
+    
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS audit_log ("
+            "timestamp TEXT, team TEXT, action TEXT, level TEXT, task TEXT, detail TEXT)"
+        )
+        self._db.commit()
+        
+    def write(self, records: List[AuditRecord]):
+        self._db.executemany(
+            "INSERT INTO audit_log VALUES (?, ?, ?, ?, ?, ?)",
+            [(r.timestamp, r.team, r.action, r.level, r.task,
+              json.dumps(r.detail, default=str) if r.detail else None) for r in records]
+        )
+        self._db.commit()
+        
+    def close(self):
+        self._db.close()
+
+
+class AuditLog:
+    """
+    Append-only audit trail with bounded memory and O(1) summary counters
+    Records are written to the configured sinks in batches by a background thread
+    """
+    
+    def __init__(self, capacity: int = 1000, sinks: Optional[List[Any]] = None,
+                 flush_interval: float = 1.0, batch_size: int = 256):
+        self.capacity = capacity
+        self.sinks = list(sinks or [])
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.counts = defaultdict(int)
+        self._recent = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._flusher = None
+        if self.sinks:
+            self._flusher = threading.Thread(target=self._flush_loop, name="som-audit-flush", daemon=True)
+            self._flusher.start()
+            
+    def record(self, team: str, action: str, level: str = "inner_team", task: str = "",
+               timestamp: Optional[str] = None, **detail) -> AuditRecord:
+        """Append a record"""
+        return self._add(AuditRecord(team, action, level, task, detail or None, timestamp))
+        
+    def append(self, entry: Dict[str, Any]) -> AuditRecord:
+        """Append a plain dict entry such as AuditRecord.to_dict(); other keys are kept as detail"""
+        entry = dict(entry)
+        detail = entry.pop("detail", None) or {}
+        team, action = entry.pop("team", ""), entry.pop("action", "")
+        level, task, timestamp = entry.pop("level", "inner_team"), entry.pop("task", ""), entry.pop("timestamp", None)
+        return self._add(AuditRecord(team, action, level, task, {**entry, **detail} or None, timestamp))
+        
+    def _add(self, entry: AuditRecord) -> AuditRecord:
+        with self._lock:
+            self._recent.append(entry)
+            self.counts["total"] += 1
+            self.counts[entry.level] += 1
+        if self._flusher is not None:
+            self._queue.put(entry)
+        return entry
+        
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The most recent records as dicts, oldest first"""
+        with self._lock:
+            entries = list(self._recent)
+        if limit is not None:
+            entries = entries[-limit:]
+        return [entry.to_dict() for entry in entries]
+        
+    def summary(self) -> Dict[str, int]:
+        """Workflow counts by level"""
+        with self._lock:
+            total = self.counts["total"]
+            outer = self.counts["outer_team"]
+        return {"total_workflows": total, "inner_team_workflows": total - outer, "outer_team_workflows": outer}
+        
+    def flush(self):
+        """Block until every queued record has reached the sinks"""
+        if self._flusher is not None:
+            self._queue.join()
+            
+    def close(self):
+        """Flush and close every sink"""
+        if self._flusher is not None:
+            self.flush()
+            self._queue.put(None)
+            self._flusher.join()
+            self._flusher = None
+        for sink in self.sinks:
+            sink.close()
+            
+    def __len__(self) -> int:
+        return self.counts["total"]
+        
+    def __iter__(self):
+        return iter(self.recent())
+        
+    def _flush_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            records = [entry for entry in batch if entry is not None]
+            if records:
+                for sink in self.sinks:
+                    try:
+                        sink.write(records)
+                    except Exception as e:
+                        print(f"⚠️ Audit sink {type(sink).__name__} failed: {str(e)}")
+            for _ in batch:
+                self._queue.task_done()
+            if stopping:
+                return
+
+
+def open_audit_sink(path: str):
+    """Pick a sink by file extension: .db/.sqlite for SQLite, anything else JSONL"""
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteAuditSink(path)
+    return JsonlAuditSink(path)
+
+
+class WorkflowEvent:
+    """
+    One progress event (see KINDS) of a running team chat, delivered to an on_event callback
+    round is the number of messages already in the chat; a retry voids the chunks streamed since the last message
+    """
+    
+    __slots__ = ("kind", "team", "agent", "round", "content", "data", "timestamp")
+    
+    KINDS = ("workflow_start", "round", "chunk", "message", "retry", "workflow_end")
+    
+    def __init__(self, kind: str, team: str, agent: str = "", round: int = 0, content: str = "",
+                 data: Optional[Dict[str, Any]] = None):
+        self.kind = kind
+        self.team = team
+        self.agent = agent
+        self.round = round
+        self.content = content
+        self.data = data or {}
+        self.timestamp = time.time()
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+        
+    def __repr__(self) -> str:
+        return f"WorkflowEvent({self.kind!r}, {self.team!r}, agent={self.agent!r}, round={self.round})"
+
+
+def _emit(runtime: Dict[str, Any], kind: str, agent: str = "", round: int = 0, content: str = "", **data):
+    """Deliver a WorkflowEvent to the on_event callback bound in runtime, if any"""
+    on_event = runtime.get("events")
+    if on_event is not None:
+        on_event(WorkflowEvent(kind, runtime.get("team", ""), agent, round, content, data))
+
+
+class _ChunkStream:
+    """AutoGen IOStream that turns a streamed completion's printed fragments into chunk events"""
+    
+    def __init__(self, runtime: Dict[str, Any], agent: str, round: int):
+        self.runtime = runtime
+        self.agent = agent
+        self.round = round
+        
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False):
+        # Fragments are printed with end=""; the colour escapes around them are dropped
+        text = sep.join(str(obj) for obj in objects)
+        if end == "" and text and not text.startswith("\033["):
+            _emit(self.runtime, "chunk", self.agent, self.round, text)
+            
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        raise RuntimeError("No input is available while streaming a completion")
+
+
+def _streamed_oai_reply(recipient, messages: List[Dict], sender, runtime: Dict[str, Any]):
+    """generate_oai_reply through a streaming copy of the agent's client, emitting chunk events"""
+    client = getattr(recipient, "_som_stream_client", None)
+    if client is None:
+        client = autogen.OpenAIWrapper(**{**recipient.llm_config, "stream": True})
+        recipient._som_stream_client = client
+    # In a group chat the sender is the manager; its message count is the current round
+    round = len(getattr(getattr(sender, "groupchat", None), "messages", ()))
+    from autogen.io.base import IOStream
+    with IOStream.set_default(_ChunkStream(runtime, recipient.name, round)):
+        return recipient.generate_oai_reply(messages, sender, config=client)
+
+
+def install_event_stream(agents: Dict[str, Any], group_chat):
+    """Emit a message event for every message a team agent sends into the group chat"""
+    def emit_message(sender, message, recipient, silent):
+        content = message.get("content") if isinstance(message, dict) else message
+        _emit(getattr(sender, "_som_runtime", {}), "message", sender.name, len(group_chat.messages),
+              str(content or ""))
+        return message
+        
+    for agent in agents.values():
+        agent.register_hook("process_message_before_send", emit_message)
+
+
+async def stream_events(run, cancel_event: Optional[threading.Event] = None):
+    """Async generator over the WorkflowEvents of a blocking run(on_event); closing it early sets cancel_event"""
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    finished = object()
+    
+    def on_event(event: WorkflowEvent):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+        
+    future = loop.run_in_executor(None, run, on_event)
+    future.add_done_callback(lambda _: events.put_nowait(finished))
+    try:
+        while True:
+            event = await events.get()
+            if event is finished:
+                break
+            yield event
+        await future
+    finally:
+        if not future.done() and cancel_event is not None:
+            cancel_event.set()
+
+
+def _runtime_oai_reply(recipient, messages=None, sender=None, config=None):
+    """Reply function that serves LLM replies from the bound ResponseCache and records metrics"""
+    runtime = getattr(recipient, "_som_runtime", {})
+    cache = runtime.get("response_cache")
+    metrics = runtime.get("metrics")
+    stream = runtime.get("events") is not None and runtime.get("stream_tokens", False)
+    if cache is None and metrics is None and not stream:
+        return False, None
+        
+    if messages is None:
+        messages = recipient.chat_messages[sender]
+    team = runtime.get("team", "")
+    config_list = (recipient.llm_config or {}).get("config_list", [])
+    model = ",".join(str(entry.get("model", "")) for entry in config_list)
+    
+    key = None
+    if cache is not None:
+        key = cache.make_key(model, recipient.system_message, messages)
+        reply = cache.get(key)
+        if metrics is not None:
+            outcome = "som_cache_hits_total" if reply is not None else "som_cache_misses_total"
+            metrics.inc(outcome, team=team, agent=recipient.name)
+        if reply is not None:
+            return True, reply
+        if cache.replay:
+            raise ResponseCacheMiss(f"No recorded response for {recipient.name} ({key[:12]})")
+            
+    usage_before = _agent_usage(recipient)
+    timer = metrics.span("llm_call", team, recipient.name, model=model) if metrics else nullcontext()
+    with timer:
+        if stream:
+            final, reply = _streamed_oai_reply(recipient, messages, sender, runtime)
+        else:
+            final, reply = recipient.generate_oai_reply(messages, sender)
+        
+    if metrics is not None:
+        usage_after = _agent_usage(recipient)
+        for field in usage_after:
+            metrics.inc(f"som_{field}_total", usage_after[field] - usage_before[field],
+                        team=team, agent=recipient.name)
+    if cache is not None and final and reply is not None:
+        cache.set(key, model, reply)
+    return final, reply
+
+
+async def _a_runtime_oai_reply(recipient, messages=None, sender=None, config=None):
+    """Async _runtime_oai_reply; the blocking provider call runs in the loop's default executor"""
+    runtime = getattr(recipient, "_som_runtime", {})
+    stream = runtime.get("events") is not None and runtime.get("stream_tokens", False)
+    if runtime.get("response_cache") is None and runtime.get("metrics") is None and not stream:
+        return False, None
+    # Copy the context so AutoGen's IOStream default reaches the worker thread
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        None, context.run, _runtime_oai_reply, recipient, messages, sender, config
+    )
+
+
+def install_runtime_reply(agent):
+    """Register the cache/metrics reply functions just ahead of the agent's sync and async LLM replies"""
+    if not getattr(agent, "llm_config", None):
+        return
+        
+    def position_of(reply_func) -> int:
+        for i, entry in enumerate(agent._reply_func_list):
+            if entry["reply_func"] is reply_func:
+                return i
+        return 0
+        
+    agent.register_reply([autogen.Agent, None], _runtime_oai_reply,
+                         position=position_of(autogen.ConversableAgent.generate_oai_reply))
+    # a_generate_oai_reply comes first in async chats, so the async variant must precede it
+    agent.register_reply([autogen.Agent, None], _a_runtime_oai_reply,
+                         position=position_of(autogen.ConversableAgent.a_generate_oai_reply),
+                         ignore_async_in_sync_chat=True)
+
+
+def _stop_if_cancelled(runtime: Dict[str, Any]):
+    """End the group chat at this round boundary once the bound cancel_event is set"""
+    cancel_event = runtime.get("cancel_event")
+    if cancel_event is not None and cancel_event.is_set():
+        from autogen.agentchat.groupchat import NoEligibleSpeaker
+        raise NoEligibleSpeaker("Workflow cancelled")
+
+
+def install_round_instrumentation(group_chat, team_name: str):
+    """Instrument, checkpoint and stop the chat at round boundaries; call before building the GroupChatManager"""
+    from autogen.agentchat.groupchat import NoEligibleSpeaker
+    select_speaker = group_chat.select_speaker
+    a_select_speaker = group_chat.a_select_speaker
+    
+    def timed_select_speaker(last_speaker, selector):
+        runtime = getattr(selector, "_som_runtime", {})
+        _stop_if_cancelled(runtime)
+        handoff = _stop_if_finished(runtime, group_chat)
+        metrics = runtime.get("metrics")
+        try:
+            if metrics is None:
+                speaker = handoff or select_speaker(last_speaker, selector)
+            else:
+                metrics.inc("som_rounds_total", team=team_name, agent=selector.name)
+                with metrics.span("speaker_selection", team_name, selector.name):
+                    speaker = handoff or select_speaker(last_speaker, selector)
+        except NoEligibleSpeaker:
+            # A terminal role of the speaker graph has spoken
+            runtime.setdefault("stop_reason", "terminal")
+            raise
+        _checkpoint_round(runtime, group_chat.messages, speaker)
+        _emit(runtime, "round", speaker.name, len(group_chat.messages))
+        return speaker
+            
+    async def a_timed_select_speaker(last_speaker, selector):
+        runtime = getattr(selector, "_som_runtime", {})
+        _stop_if_cancelled(runtime)
+        handoff = _stop_if_finished(runtime, group_chat)
+        metrics = runtime.get("metrics")
+        try:
+            if metrics is None:
+                speaker = handoff or await a_select_speaker(last_speaker, selector)
+            else:
+                metrics.inc("som_rounds_total", team=team_name, agent=selector.name)
+                with metrics.span("speaker_selection", team_name, selector.name):
+                    speaker = handoff or await a_select_speaker(last_speaker, selector)
+        except NoEligibleSpeaker:
+            # A terminal role of the speaker graph has spoken
+            runtime.setdefault("stop_reason", "terminal")
+            raise
+        _checkpoint_round(runtime, group_chat.messages, speaker)
+        _emit(runtime, "round", speaker.name, len(group_chat.messages))
+        return speaker
+            
+    group_chat.select_speaker = timed_select_speaker
+    group_chat.a_select_speaker = a_timed_select_speaker
+
+
+class SpeakerGraph:
+    """
+    Declarative next-speaker graph, used as a GroupChat's speaker_selection_method
+    A role with one successor hands over without the manager's LLM call; terminal roles end the chat
+    """
+    
+    def __init__(self, transitions: Dict[str, List[str]], agents: Dict[str, Any], terminal: List[str] = ()):
+        unknown = {role for role, successors in transitions.items() for role in [role] + successors} - set(agents)
+        if unknown:
+            raise ValueError(f"Speaker graph refers to unknown agent roles: {sorted(unknown)}")
+        dead_ends = self.dead_ends(transitions, agents, terminal)
+        if dead_ends:
+            raise ValueError(f"Speaker graph roles without successors would end the chat: {dead_ends}")
+        self.successors = {agents[role]: [agents[successor] for successor in successors]
+                           for role, successors in transitions.items()}
+        self.saved = 0
+        self.fallbacks = 0
+        
+    @staticmethod
+    def dead_ends(transitions: Dict[str, List[str]], roles, terminal: List[str] = ()) -> List[str]:
+        """Roles that would silently end the chat: absent from a non-empty graph and not terminal"""
+        if not transitions:
+            return []
+        return [role for role in roles if role not in transitions and role not in terminal]
+        
+    def group_chat_kwargs(self) -> Dict[str, Any]:
+        """GroupChat arguments enforcing this graph"""
+        return {
+            "speaker_selection_method": self,
+            "allowed_or_disallowed_speaker_transitions": self.successors,
+            "speaker_transitions_type": "allowed"
+        }
+        
+    def __call__(self, last_speaker, group_chat):
+        successors = self.successors.get(last_speaker, [])
+        if len(successors) != 1:
+            self.fallbacks += 1
+            return "auto"
+            
+        self.saved += 1
+        runtime = getattr(last_speaker, "_som_runtime", {})
+        metrics = runtime.get("metrics")
+        if metrics is not None:
+            metrics.inc("som_speaker_selections_saved_total", team=runtime.get("team", ""), agent="chat_manager")
+        return successors[0]
+
+
+class TerminationPolicy:
+    """
+    When a team's group chat may stop before max_round
+    The gate's stop decisions end the chat; agreement or repetition hands the next turn to the gate
+    """
+    
+    # Reasons from check() that hand the turn to the gate instead of ending the chat
+    HANDOFF_REASONS = ("consensus", "repetition")
+    
+    DEFAULT_CONSENSUS = (r"\b(i agree|we agree|agreed|consensus (is )?reached|no further "
+                         r"(changes|comments|concerns|input)|lgtm|ready for (final )?approval)\b")
+    
+    def __init__(self, decisions: Tuple[str, ...] = ("APPROVE", "REJECT"),
+                 consensus_pattern: Optional[str] = DEFAULT_CONSENSUS, consensus_quorum: int = 2,
+                 repeat_threshold: Optional[float] = 0.9, adaptive_rounds: bool = True,
+                 long_task_words: int = 80, list_items: int = 3):
+        self.decisions = tuple(decision.upper() for decision in decisions)
+        self.consensus = re.compile(consensus_pattern, re.IGNORECASE) if consensus_pattern else None
+        self.consensus_quorum = max(1, consensus_quorum)
+        self.repeat_threshold = repeat_threshold
+        self.adaptive_rounds = adaptive_rounds
+        self.long_task_words = long_task_words
+        self.list_items = list_items
+        
+    @classmethod
+    def disabled(cls) -> "TerminationPolicy":
+        """Policy that always runs chats to max_round"""
+        return cls(decisions=(), consensus_pattern=None, repeat_threshold=None, adaptive_rounds=False)
+        
+    def round_budget(self, task: str, team_size: int, max_round: int) -> int:
+        """Rounds for one task: the opening message plus one speaker cycle per complexity step"""
+        if not self.adaptive_rounds:
+            return max_round
+        cycles = 1
+        if len(task.split()) > self.long_task_words:
+            cycles += 1
+        if len(re.findall(r"(?m)^\s*(?:\d+[.)]|[-*•])\s+\S", task)) >= self.list_items:
+            cycles += 1
+        return max(2, min(max_round, cycles * team_size + 1))
+        
+    def check(self, messages: List[Dict], gate: Optional[str], round_budget: Optional[int] = None) -> Optional[str]:
+        """Reason to stop the chat before the next round, or None to continue"""
+        if len(messages) < 2:
+            return None
+        latest = messages[-1]
+        content = str(latest.get("content") or "").strip()
+        
+        if latest.get("name") == gate:
+            verdict = content.split(None, 1)[0].strip(".:,!").upper() if content else ""
+            if verdict in self.decisions and (verdict != "APPROVE" or len(messages) > 2):
+                return verdict.lower()
+        else:
+            if self.consensus is not None and self._consensus(messages, gate):
+                return "consensus"
+            if self.repeat_threshold is not None and self._repeated(messages):
+                return "repetition"
+                
+        if round_budget is not None and len(messages) >= round_budget:
+            return "round_budget"
+        return None
+        
+    def _consensus(self, messages: List[Dict], gate: Optional[str]) -> bool:
+        speakers = set()
+        for message in reversed(messages[1:]):
+            if message.get("name") == gate:
+                break
+            if not self.consensus.search(str(message.get("content") or "")):
+                return False
+            speakers.add(message.get("name"))
+            if len(speakers) >= self.consensus_quorum:
+                return True
+        return False
+        
+    def _repeated(self, messages: List[Dict]) -> bool:
+        latest = messages[-1]
+        words = set(str(latest.get("content") or "").lower().split())
+        if not words:
+            return False
+        for earlier in messages[1:-1]:
+            if earlier.get("name") != latest.get("name"):
+                continue
+            other = set(str(earlier.get("content") or "").lower().split())
+            if other and len(words & other) / len(words | other) >= self.repeat_threshold:
+                return True
+        return False
+
+
+def _stop_if_finished(runtime: Dict[str, Any], group_chat):
+    """End the chat once the bound TerminationPolicy says it is done; returns the gate if it should speak next"""
+    policy = runtime.get("termination")
+    if policy is None:
+        return None
+    gate = runtime.get("gate")
+    reason = policy.check(group_chat.messages, gate, runtime.get("round_budget"))
+    if reason is None:
+        return None
+    if reason in policy.HANDOFF_REASONS and gate is not None:
+        print(f"🤝 {runtime.get('team', '')}: {reason}; handing the turn to {gate}")
+        return group_chat.agent_by_name(gate)
+    runtime["stop_reason"] = reason
+    from autogen.agentchat.groupchat import NoEligibleSpeaker
+    raise NoEligibleSpeaker(f"Chat finished early: {reason}")
+
+
+async def _a_until_stopped(chat):
+    """Await an async chat, treating a round-boundary stop (NoEligibleSpeaker) as its normal end"""
+    from autogen.agentchat.groupchat import NoEligibleSpeaker
+    try:
+        await chat
+    except NoEligibleSpeaker:
+        pass
+
+
+class CompactionPolicy:
+    """
+    Context-window budget for one team's group chat
+    Agents see the opening message, a summary of older turns and the last window messages verbatim
+    """
+    
+    def __init__(self, window: int = 6, summary_chars: int = 1500, default_budget: int = 4000,
+                 role_budgets: Optional[Dict[str, int]] = None, selector_window: Optional[int] = None):
+        self.window = window
+        self.summary_chars = summary_chars
+        self.default_budget = default_budget
+        self.role_budgets = role_budgets or {}
+        self.selector_window = selector_window if selector_window is not None else window
+        
+    def budget_for(self, agent_name: str) -> int:
+        return self.role_budgets.get(agent_name, self.default_budget)
+
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    """Cheap token estimate (about four characters per token plus per-message overhead)"""
+    return sum(len(str(message.get("content") or "")) // 4 + 4 for message in messages)
+
+
+class HistoryCompactor:
+    """process_all_messages_before_reply hook applying the bound CompactionPolicy to one agent"""
+    
+    SUMMARY_LINE_CHARS = 160
+    
+    def __init__(self, agent):
+        self.agent = agent
+        self._conversation = None
+        self._summarized = 0
+        self._summary_lines = deque()
+        
+    def __call__(self, messages: List[Dict]) -> List[Dict]:
+        runtime = getattr(self.agent, "_som_runtime", {})
+        policy = runtime.get("compaction")
+        if policy is None or not messages:
+            return messages
+            
+        budget = policy.budget_for(self.agent.name)
+        before = estimate_tokens(messages)
+        if len(messages) <= policy.window + 1 and before <= budget:
+            return messages
+            
+        head, body = messages[0], messages[1:]
+        split = max(0, len(body) - policy.window)
+        # The summary gets at most a quarter of the budget, so small budgets still keep recent turns
+        summary_reserve = min(policy.summary_chars, budget) // 4
+        while split < len(body) - 1 and estimate_tokens([head] + body[split:]) + summary_reserve > budget:
+            split += 1
+        older, recent = body[:split], body[split:]
+        if not older:
+            return messages
+            
+        # Clamp the summary to whatever the verbatim messages leave of the budget
+        summary_chars = min(policy.summary_chars, (budget - estimate_tokens([head] + recent) - 4) * 4)
+        summary = self._summary(head, older, policy, summary_chars)
+        compacted = [head] + ([{"role": "user", "content": summary}] if summary else []) + recent
+        metrics = runtime.get("metrics")
+        if metrics is not None:
+            metrics.inc("som_compacted_tokens_total", before - estimate_tokens(compacted),
+                        team=runtime.get("team", ""), agent=self.agent.name)
+        return compacted
+        
+    def _summary(self, head: Dict, older: List[Dict], policy: CompactionPolicy, max_chars: int) -> str:
+        # Older turns only ever grow during a chat, so extend the cached summary incrementally
+        conversation = hash(str(head.get("content")))
+        if conversation != self._conversation or len(older) < self._summarized:
+            self._conversation = conversation
+            self._summarized = 0
+            self._summary_lines.clear()
+            
+        for message in older[self._summarized:]:
+            content = " ".join(str(message.get("content") or "").split())
+            if len(content) > self.SUMMARY_LINE_CHARS:
+                content = content[:self.SUMMARY_LINE_CHARS - 3] + "..."
+            self._summary_lines.append(f"- {message.get('name', message.get('role', 'agent'))}: {content}")
+        self._summarized = len(older)
+        
+        while len(self._summary_lines) > 1 and sum(len(line) + 1 for line in self._summary_lines) > policy.summary_chars:
+            self._summary_lines.popleft()
+            
+        header = "Summary of earlier discussion:"
+        lines, used = [], len(header)
+        for line in reversed(self._summary_lines):
+            used += len(line) + 1
+            if used > max_chars:
+                break
+            lines.append(line)
+        return "\n".join([header] + lines[::-1]) if lines else ""
+
+
+def install_history_compaction(agents: Dict[str, Any], group_chat):
+    """Compact the history of every LLM agent and of speaker selection; call before building the GroupChatManager"""
+    for agent in agents.values():
+        if getattr(agent, "llm_config", None):
+            agent.register_hook("process_all_messages_before_reply", HistoryCompactor(agent))
+            
+    auto_select_speaker = group_chat._auto_select_speaker
+    a_auto_select_speaker = group_chat.a_auto_select_speaker
+    
+    def selection_window(selector, messages):
+        policy = getattr(selector, "_som_runtime", {}).get("compaction")
+        if policy is None or not messages or len(messages) <= policy.selector_window:
+            return messages
+        return messages[-policy.selector_window:]
+        
+    def compacted_auto_select_speaker(last_speaker, selector, messages, agents):
+        return auto_select_speaker(last_speaker, selector, selection_window(selector, messages), agents)
+        
+    async def a_compacted_auto_select_speaker(last_speaker, selector, messages, agents):
+        return await a_auto_select_speaker(last_speaker, selector, selection_window(selector, messages), agents)
+        
+    group_chat._auto_select_speaker = compacted_auto_select_speaker
+    group_chat.a_auto_select_speaker = a_compacted_auto_select_speaker
+
+
+class TeamDigest:
+    """
+    Size-bounded result of one team workflow, handed from inner teams to outer coordination
+    render() produces the text the outer team receives instead of the full chat transcript
+    """
+    
+    __slots__ = ("team", "task", "decision", "key_findings", "final_output", "rounds",
+                 "prompt_tokens", "completion_tokens", "duration", "stop_reason", "rounds_saved")
+    
+    DECISIONS = ("APPROVE", "MODIFY", "REJECT")
+    MAX_FINDINGS = 6
+    FINDING_CHARS = 240
+    OUTPUT_CHARS = 600
+    RENDER_CHARS = 2000
+    
+    def __init__(self, team: str, task: str, decision: Optional[str] = None,
+                 key_findings: Optional[List[str]] = None, final_output: str = "", rounds: int = 0,
+                 prompt_tokens: int = 0, completion_tokens: int = 0, duration: float = 0.0,
+                 stop_reason: Optional[str] = None, rounds_saved: int = 0):
+        self.team = team
+        self.task = task
+        self.decision = decision
+        self.key_findings = key_findings or []
+        self.final_output = final_output
+        self.rounds = rounds
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.duration = duration
+        self.stop_reason = stop_reason
+        self.rounds_saved = rounds_saved
+        
+    @staticmethod
+    def _clip(text: Any, limit: int) -> str:
+        text = " ".join(str(text or "").split())
+        return text if len(text) <= limit else text[:limit - 3] + "..."
+        
+    @classmethod
+    def from_chat(cls, team: str, task: str, messages: List[Dict], gate_agent: str,
+                  tokens: Dict[str, int], duration: float, stop_reason: Optional[str] = None,
+                  max_round: Optional[int] = None) -> "TeamDigest":
+        """Distil a finished group chat; messages[0] is the gate agent's opening prompt"""
+        decision = None
+        latest = OrderedDict()
+        for message in messages[1:]:
+            content = str(message.get("content") or "").strip()
+            if not content:
+                continue
+            name = message.get("name", "")
+            if name == gate_agent:
+                verdict = content.split(None, 1)[0].strip(".:,!").upper()
+                if verdict in cls.DECISIONS:
+                    decision = verdict
+                continue
+            latest.pop(name, None)
+            latest[name] = content
+            
+        # The last contribution becomes final_output; the others are the key findings
+        contributions = list(latest.items())
+        findings = [f"{name}: {cls._clip(content, cls.FINDING_CHARS)}"
+                    for name, content in contributions[-cls.MAX_FINDINGS - 1:-1]]
+        final_output = cls._clip(contributions[-1][1], cls.OUTPUT_CHARS) if contributions else ""
+        return cls(team, task, decision, findings, final_output, rounds=max(0, len(messages) - 1),
+                   prompt_tokens=tokens.get("prompt_tokens", 0),
+                   completion_tokens=tokens.get("completion_tokens", 0), duration=duration,
+                   stop_reason=stop_reason,
+                   rounds_saved=max(0, max_round - len(messages)) if max_round and stop_reason not in (None, "error") else 0)
+        
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+        
+    def render(self, limit: Optional[int] = None) -> str:
+        """Compact text form for another team's prompt"""
+        lines = [f"[{self.team}] decision: {self.decision or 'none'}; rounds: {self.rounds}; "
+                 f"tokens: {self.prompt_tokens + self.completion_tokens}"
+                 + ("; chat failed" if self.stop_reason == "error"
+                    else f"; stopped early: {self.stop_reason}" if self.stop_reason else "")]
+        if self.final_output:
+            lines.append(f"Final output: {self.final_output}")
+        if self.key_findings:
+            lines.append("Key findings:")
+            lines.extend(f"- {finding}" for finding in self.key_findings)
+        text, limit = "\n".join(lines), limit or self.RENDER_CHARS
+        return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _report_early_stop(digest: TeamDigest, metrics: Optional[WorkflowMetrics], max_round: int):
+    """Announce a chat that ended before max_round and count the rounds it saved"""
+    if not digest.rounds_saved:
+        return
+    reason = digest.stop_reason or "ended"
+    print(f"⏹️ {digest.team} chat stopped after {digest.rounds} rounds ({reason}); "
+          f"{digest.rounds_saved} of {max_round} rounds saved")
+    if metrics is not None:
+        metrics.inc("som_rounds_saved_total", digest.rounds_saved, team=digest.team, agent="chat_manager",
+                    reason=reason)
+
+
+def _checkpoint_round(runtime: Dict[str, Any], messages: List[Dict], speaker):
+    """Save the chat state at a round boundary to the bound CheckpointStore"""
+    store = runtime.get("checkpoints")
+    key = runtime.get("checkpoint_key")
+    if store is None or key is None or not messages:
+        return
+    gate = runtime.get("gate")
+    store.save(key, runtime.get("team", ""), messages, speaker.name,
+               pending_gate=gate if speaker.name == gate else None)
+
+
+def _resume_history(team: PooledTeam, message: str, max_retries: int) -> Optional[List[Dict]]:
+    """Bind the chat's checkpoint key and return its stored history when it should be resumed"""
+    store = team.runtime.get("checkpoints")
+    if store is None:
+        return None
+    team.runtime["checkpoint_key"] = key = CheckpointStore.make_key(team.runtime.get("team", ""), message)
+    checkpoint = store.resume_point(key, max_retries + 1)
+    if checkpoint is None:
+        return None
+    gate = f", human gate {checkpoint['pending_gate']} pending" if checkpoint["pending_gate"] else ""
+    print(f"♻️ {checkpoint['team']}: resuming interrupted chat at round {checkpoint['round']}{gate}")
+    return checkpoint["messages"]
+
+
+def _retry_or_raise(team: PooledTeam, error: Exception, attempt: int, max_retries: int) -> List[Dict]:
+    """Record a failed chat attempt; the history to resume from, or re-raise once retries are spent"""
+    store, key = team.runtime.get("checkpoints"), team.runtime.get("checkpoint_key")
+    if store is not None and key is not None:
+        store.fail(key, str(error))
+    if attempt >= max_retries or isinstance(error, ResponseCacheMiss):
+        raise error
+    history = [dict(message) for message in team.group_chat.messages]
+    name = team.runtime.get("team", "")
+    print(f"🔁 {name} chat failed ({str(error)}); retry {attempt + 1}/{max_retries} from round {len(history)}")
+    # Chunks streamed since the last complete message belong to the failed attempt
+    _emit(team.runtime, "retry", team.chat_manager.name, len(history), str(error), attempt=attempt + 1)
+    metrics = team.runtime.get("metrics")
+    if metrics is not None:
+        metrics.inc("som_chat_retries_total", team=name, agent="chat_manager")
+    return history
+
+
+def _resume_config(team: PooledTeam, history: List[Dict]):
+    """Shallow copy of the team's group chat limited to the rounds an interrupted chat has left"""
+    config = copy.copy(team.group_chat)
+    config.max_round = max(1, team.group_chat.max_round - len(history) + 1)
+    return config
+
+
+def run_resumable_chat(team: PooledTeam, opener, message: str, max_retries: int = 2):
+    """Run a leased team's chat from opener's message, resuming from the last good round on errors"""
+    history = _resume_history(team, message, max_retries)
+    for attempt in range(max_retries + 1):
+        try:
+            if history:
+                # Continue the chat from its last message; re-sending it would emit it twice
+                speaker, last_message = team.chat_manager.resume(history, silent=True)
+                team.chat_manager.run_chat([last_message], speaker, _resume_config(team, history))
+            else:
+                opener.initiate_chat(team.chat_manager, message=message)
+            break
+        except Exception as e:
+            history = _retry_or_raise(team, e, attempt, max_retries)
+    if team.runtime.get("checkpoints") is not None:
+        team.runtime["checkpoints"].complete(team.runtime["checkpoint_key"])
+
+
+async def a_run_resumable_chat(team: PooledTeam, opener, message: str, max_retries: int = 2):
+    """Async counterpart of run_resumable_chat"""
+    history = _resume_history(team, message, max_retries)
+    for attempt in range(max_retries + 1):
+        try:
+            if history:
+                speaker, last_message = await team.chat_manager.a_resume(history, None, silent=True)
+                await _a_until_stopped(team.chat_manager.a_run_chat([last_message], speaker,
+                                                                    _resume_config(team, history)))
+            else:
+                await _a_until_stopped(opener.a_initiate_chat(team.chat_manager, message=message))
+            break
+        except Exception as e:
+            history = _retry_or_raise(team, e, attempt, max_retries)
+    if team.runtime.get("checkpoints") is not None:
+        team.runtime["checkpoints"].complete(team.runtime["checkpoint_key"])
+
+
+class _IndexedResult:
+    """One finished team result held by a TaskIndex"""
+    
+    __slots__ = ("task", "digest", "created", "last_used")
+    
+    def __init__(self, task: str, digest: TeamDigest):
+        self.task = task
+        self.digest = digest
+        self.created = self.last_used = time.time()
+
+
+class TaskIndex:
+    """
+    Near-duplicate index of finished team tasks and their digests, per scope (normally the team type)
+    Tasks are compared by cosine similarity of hashed n-gram vectors, in one NumPy matrix when available
+    """
+    
+    def __init__(self, threshold: float = 0.9, seed_threshold: Optional[float] = None,
+                 max_entries: int = 1024, ttl: Optional[float] = None, dim: int = 4096,
+                 char_ngram: int = 4, use_numpy: Optional[bool] = None):
+        self.threshold = threshold
+        self.seed_threshold = seed_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.dim = dim
+        self.char_ngram = char_ngram
+        self.use_numpy = NUMPY_AVAILABLE if use_numpy is None else use_numpy
+        self.hits = 0
+        self.seeds = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scopes = {}
+        self._lock = threading.Lock()
+        
+    def embed(self, text: str):
+        """Hashed n-gram vector of text: a NumPy array, or a sparse {bucket: weight} dict"""
+        words = re.findall(r"\w+", text.lower())
+        joined = " ".join(words)
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        features += [joined[i:i + self.char_ngram] for i in range(max(0, len(joined) - self.char_ngram + 1))]
+        
+        sparse = defaultdict(float)
+        for feature in features:
+            code = zlib.crc32(feature.encode("utf-8"))
+            sparse[code % self.dim] += 1.0 if code & 0x80000000 else -1.0
+        norm = sum(value * value for value in sparse.values()) ** 0.5 or 1.0
+        if not self.use_numpy:
+            return {bucket: value / norm for bucket, value in sparse.items() if value}
+        vector = numpy.zeros(self.dim, dtype=numpy.float32)
+        if sparse:
+            vector[list(sparse)] = list(sparse.values())
+        return vector / norm
+        
+    def lookup(self, scope: str, task: str) -> Tuple[Optional[TeamDigest], float]:
+        """Digest of the most similar fresh task in scope and its similarity, or (None, 0.0)"""
+        query = self.embed(task)
+        with self._lock:
+            self._expire(scope)
+            shelf = self._scopes.get(scope)
+            if not shelf or not shelf["entries"]:
+                self.misses += 1
+                return None, 0.0
+            if self.use_numpy:
+                scores = shelf["vectors"][:len(shelf["entries"])] @ query
+                best = int(numpy.argmax(scores))
+                score = float(scores[best])
+            else:
+                scores = [sum(weight * query.get(bucket, 0.0) for bucket, weight in vector.items())
+                          for vector in shelf["vectors"]]
+                best = max(range(len(scores)), key=scores.__getitem__)
+                score = scores[best]
+            floor = self.threshold if self.seed_threshold is None else min(self.threshold, self.seed_threshold)
+            if score < floor:
+                self.misses += 1
+                return None, score
+            entry = shelf["entries"][best]
+            entry.last_used = time.time()
+            if score >= self.threshold:
+                self.hits += 1
+            else:
+                self.seeds += 1
+            return entry.digest, score
+            
+    def add(self, scope: str, task: str, digest: TeamDigest):
+        """Index a finished task's digest, evicting the least recently used entry when full"""
+        vector = self.embed(task)
+        with self._lock:
+            shelf = self._scopes.setdefault(scope, {"vectors": None if self.use_numpy else [], "entries": []})
+            entries = shelf["entries"]
+            if self.use_numpy:
+                if shelf["vectors"] is None or len(entries) == len(shelf["vectors"]):
+                    grown = numpy.zeros((max(16, len(entries) * 2), self.dim), dtype=numpy.float32)
+                    if shelf["vectors"] is not None:
+                        grown[:len(entries)] = shelf["vectors"]
+                    shelf["vectors"] = grown
+                shelf["vectors"][len(entries)] = vector
+            else:
+                shelf["vectors"].append(vector)
+            entries.append(_IndexedResult(task, digest))
+            
+            while len(self) > self.max_entries:
+                victim_scope, position = min(((name, i) for name, other in self._scopes.items()
+                                              for i, _ in enumerate(other["entries"])),
+                                             key=lambda item: self._scopes[item[0]]["entries"][item[1]].last_used)
+                self._remove(victim_scope, position)
+                self.evictions += 1
+                
+    def invalidate(self, scope: Optional[str] = None):
+        """Forget every entry, or only those of one scope"""
+        with self._lock:
+            if scope is None:
+                self._scopes.clear()
+            else:
+                self._scopes.pop(scope, None)
+                
+    def __getstate__(self) -> Dict[str, Any]:
+        # Worker processes start from a copy of the entries indexed so far
+        with self._lock:
+            state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+        
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self), "hits": self.hits, "seeds": self.seeds, "misses": self.misses,
+                    "evictions": self.evictions, "numpy": self.use_numpy}
+                    
+    def __len__(self) -> int:
+        return sum(len(shelf["entries"]) for shelf in self._scopes.values())
+        
+    def _expire(self, scope: str):
+        shelf = self._scopes.get(scope)
+        if self.ttl is None or not shelf:
+            return
+        cutoff = time.time() - self.ttl
+        for position in range(len(shelf["entries"]) - 1, -1, -1):
+            if shelf["entries"][position].created < cutoff:
+                self._remove(scope, position)
+                self.evictions += 1
+                
+    def _remove(self, scope: str, position: int):
+        # Move the last entry into the gap so NumPy rows stay contiguous
+        shelf = self._scopes[scope]
+        entries, vectors = shelf["entries"], shelf["vectors"]
+        last = len(entries) - 1
+        entries[position] = entries[last]
+        vectors[position] = vectors[last]
+        entries.pop()
+        if not self.use_numpy:
+            vectors.pop()
+
+
+class ConcurrencyBudget:
+    """
+    Team workflow slots shared by every society in a hierarchy
+    Only leaf team chats hold a slot, so nesting depth can never exhaust the budget
+    """
+    
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self.peak = 0
+        self._semaphore = threading.Semaphore(self.limit)
+        self._lock = threading.Lock()
+        
+    @contextmanager
+    def slot(self):
+        with self._semaphore:
+            self._track(1)
+            try:
+                yield
+            finally:
+                self._track(-1)
+                
+    def async_slot(self):
+        """asyncio counterpart of slot(), sharing its slots without blocking the event loop"""
+        budget = self
+        
+        class AsyncSlot:
+            async def __aenter__(self):
+                while not budget._semaphore.acquire(blocking=False):
+                    await asyncio.sleep(0.01)
+                budget._track(1)
+                
+            async def __aexit__(self, *exc_info):
+                budget._track(-1)
+                budget._semaphore.release()
+                
+        return AsyncSlot()
+        
+    def _track(self, delta: int):
+        with self._lock:
+            self.in_use += delta
+            self.peak = max(self.peak, self.in_use)
+
+
+def create_team_agent(team, name: Optional[str] = None, description: Optional[str] = None):
+    """Wrap a team (InnerTeamManager or a whole SoMArchitecture) as one agent that replies with its TeamDigest"""
+    name = name or getattr(team, "team_name", None) or team.name
+    agent = autogen.ConversableAgent(
+        name=name,
+        llm_config=False,
+        human_input_mode="NEVER",
+        code_execution_config=False,
+        description=description or f"{name}: a sub-team that works a task through and reports its results."
+    )
+    
+    def inherit_runtime(recipient) -> Optional[threading.Event]:
+        runtime = getattr(recipient, "_som_runtime", {})
+        for service in ("response_cache", "approval_broker", "metrics"):
+            if getattr(team, service, None) is None and runtime.get(service) is not None:
+                setattr(team, service, runtime[service])
+        return runtime.get("cancel_event")
+        
+    def reply(digest: Optional[TeamDigest]) -> Tuple[bool, str]:
+        return True, digest.render() if digest is not None else f"{name} produced no result."
+        
+    def run_team(recipient, messages=None, sender=None, config=None):
+        cancel_event = inherit_runtime(recipient)
+        return reply(team.execute_workflow(str(messages[-1].get("content") or ""), cancel_event=cancel_event))
+        
+    async def a_run_team(recipient, messages=None, sender=None, config=None):
+        cancel_event = inherit_runtime(recipient)
+        return reply(await team.a_execute_workflow(str(messages[-1].get("content") or ""),
+                                                   cancel_event=cancel_event))
+        
+    agent.register_reply([autogen.Agent, None], run_team)
+    agent.register_reply([autogen.Agent, None], a_run_team, ignore_async_in_sync_chat=True)
+    return agent
+
+
+def _json_default(value: Any) -> Any:
+    """json.dumps fallback for digests and other result objects"""
+    return value.to_dict() if hasattr(value, "to_dict") else str(value)
+
+
 class SoMArchitecture:
     """
     Society of Mind Architecture with UserProxyAgent integration
     Demonstrates multi-level human oversight in agent coordination
     """
     
-    def __init__(self, config_list: List[Dict]):
+    # Most recent audit entries included in the printed report
+    REPORT_LOG_ENTRIES = 50
+    
+    def __init__(self, config_list: List[Dict], max_concurrency: int = 2,
+                 team_timeout: Optional[float] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 approval_broker: Optional[ApprovalBroker] = None,
+                 metrics: Optional[WorkflowMetrics] = None,
+                 max_round: int = 8,
+                 audit_log: Optional[AuditLog] = None,
+                 compaction: Optional[Dict[str, CompactionPolicy]] = None,
+                 name: str = "SoM",
+                 termination: Optional[TerminationPolicy] = None,
+                 task_index: Optional[TaskIndex] = None,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 max_retries: int = 2):
+        self.name = name
+        self.task_index = task_index
+        self.checkpoints = checkpoints
+        self.max_retries = max_retries
         self.config_list = config_list
+        self.max_round = max_round
+        self.compaction = compaction or {}
+        self.termination = termination
+        self.response_cache = response_cache
+        self.approval_broker = approval_broker
+        self.metrics = metrics
         self.inner_teams = {}
         self.outer_team = None
-        self.workflow_log = []
+        self.workflow_log = audit_log if audit_log is not None else AuditLog()
+        self.max_concurrency = max_concurrency
+        self.team_timeout = team_timeout
+        self.cancel_event = threading.Event()
+        self.budget = ConcurrencyBudget(max_concurrency)
         
     def register_inner_team(self, team_name: str, team_manager):
-        """Register an inner team with the outer coordination system"""
+        """Register an inner team (or a sub-society) with the outer coordination system"""
         self.inner_teams[team_name] = team_manager
+        team_manager.parent_som = self
+        if isinstance(team_manager, SoMArchitecture):
+            team_manager._share_budget(self.budget)
         print(f"Inner team '{team_name}' registered with outer coordination system")
         
+    def _share_budget(self, budget: ConcurrencyBudget):
+        self.budget = budget
+        for team in self.inner_teams.values():
+            if isinstance(team, SoMArchitecture):
+                team._share_budget(budget)
+        
     def create_outer_team(self):
         """Create outer team coordination system"""
         if not AUTOGEN_AVAILABLE:
             return None
             
-        self.outer_team = OuterTeamManager(self.config_list)
+        self.outer_team = OuterTeamManager(self.config_list, response_cache=self.response_cache,
+                                           approval_broker=self.approval_broker,
+                                           metrics=self.metrics, max_round=self.max_round,
+                                           compaction=self.compaction_for("Outer_Team"),
+                                           termination=self.termination, checkpoints=self.checkpoints,
+                                           max_retries=self.max_retries)
+        self.outer_team.parent_som = self
         return self.outer_team
+
+    def create_inner_team(self, team_name: str, team_type: Optional[str] = None) -> "InnerTeamManager":
+        """Create an inner team manager sharing this architecture's runtime services"""
+        return InnerTeamManager(team_name, self.config_list, response_cache=self.response_cache,
+                                approval_broker=self.approval_broker, metrics=self.metrics,
+                                max_round=self.max_round, compaction=self.compaction_for(team_name),
+                                team_type=team_type, termination=self.termination,
+                                task_index=self.task_index, checkpoints=self.checkpoints,
+                                max_retries=self.max_retries)
+        
+    def compaction_for(self, team_name: str) -> Optional[CompactionPolicy]:
+        """Team-specific compaction policy, falling back to the "default" entry"""
+        return self.compaction.get(team_name, self.compaction.get("default"))
+        
+    def cancel(self):
+        """Cancel every inner team workflow that has not finished yet"""
+        self.cancel_event.set()
+
+    def execute_inner_teams(self, tasks: Dict[str, str],
+                            max_concurrency: Optional[int] = None,
+                            team_timeout: Optional[float] = None,
+                            cancel_event: Optional[threading.Event] = None) -> Dict[str, Dict[str, Any]]:
+        """Run the registered inner teams in parallel on the concurrency budget and join on their results"""
+        budget = ConcurrencyBudget(max_concurrency) if max_concurrency else self.budget
+        team_timeout = team_timeout if team_timeout is not None else self.team_timeout
+        
+        def cancelled() -> bool:
+            return self.cancel_event.is_set() or (cancel_event is not None and cancel_event.is_set())
+            
+        results = {}
+        team_events = {}
+        started = {}
+        
+        def run_team(team_name: str, task: str):
+            event = team_events[team_name]
+            team = self.inner_teams[team_name]
+            with nullcontext() if isinstance(team, SoMArchitecture) else budget.slot():
+                if event.is_set() or cancelled():
+                    return "cancelled", None
+                started[team_name] = time.monotonic()
+                output = team.execute_workflow(task, cancel_event=event)
+            return ("cancelled" if event.is_set() else "completed"), output
+        
+        # Workers mostly wait on budget slots and chats; the budget bounds the actual work
+        executor = ThreadPoolExecutor(max_workers=max(1, len(tasks)),
+                                      thread_name_prefix="som-team")
+        futures = {}
+        for team_name, task in tasks.items():
+            if team_name not in self.inner_teams:
+                raise KeyError(f"Inner team '{team_name}' is not registered")
+            team_events[team_name] = threading.Event()
+            futures[executor.submit(run_team, team_name, task)] = team_name
+        
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    team_name = futures[future]
+                    began = started.get(team_name)
+                    duration = time.monotonic() - began if began else 0.0
+                    try:
+                        status, output = future.result()
+                        results[team_name] = {"status": status, "result": output, "duration": duration}
+                    except Exception as e:
+                        results[team_name] = {"status": "error", "error": str(e), "duration": duration}
+                
+                now = time.monotonic()
+                for future in list(pending):
+                    team_name = futures[future]
+                    began = started.get(team_name)
+                    timed_out = team_timeout is not None and began is not None and now - began > team_timeout
+                    if timed_out or cancelled():
+                        team_events[team_name].set()
+                        future.cancel()
+                        pending.discard(future)
+                        results[team_name] = {
+                            "status": "timeout" if timed_out else "cancelled",
+                            "result": None,
+                            "duration": now - began if began else 0.0
+                        }
+                        print(f"⏱️ Inner team '{team_name}' {results[team_name]['status']}")
+        finally:
+            # Timed out teams keep their worker thread until their current round returns
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return {team_name: results[team_name] for team_name in tasks}
+        
+    async def a_execute_inner_teams(self, tasks: Dict[str, str],
+                                    max_concurrency: Optional[int] = None,
+                                    team_timeout: Optional[float] = None,
+                                    cancel_event: Optional[threading.Event] = None) -> Dict[str, Dict[str, Any]]:
+        """Event-loop variant of execute_inner_teams; teams parked at human gates hold no thread"""
+        budget = ConcurrencyBudget(max_concurrency) if max_concurrency else self.budget
+        team_timeout = team_timeout if team_timeout is not None else self.team_timeout
         
-    def demonstrate_som_workflow(self):
+        def cancelled() -> bool:
+            return self.cancel_event.is_set() or (cancel_event is not None and cancel_event.is_set())
+            
+        team_events = {team_name: threading.Event() for team_name in tasks}
+        
+        async def watch_cancellation():
+            # As in execute_inner_teams, cancelling stops the running chats at their next round
+            while not cancelled():
+                await asyncio.sleep(0.1)
+            for event in team_events.values():
+                event.set()
+                
+        async def attempt(team_name: str, task: str) -> Dict[str, Any]:
+            started = time.monotonic()
+            event = team_events[team_name]
+            if event.is_set() or cancelled():
+                return {"status": "cancelled", "result": None, "duration": 0.0}
+            try:
+                output = await asyncio.wait_for(self.inner_teams[team_name].a_execute_workflow(task, cancel_event=event),
+                                                team_timeout)
+                status = "cancelled" if event.is_set() else "completed"
+                return {"status": status, "result": output, "duration": time.monotonic() - started}
+            except asyncio.TimeoutError:
+                event.set()
+                print(f"⏱️ Inner team '{team_name}' timeout")
+                return {"status": "timeout", "result": None, "duration": time.monotonic() - started}
+            except Exception as e:
+                return {"status": "error", "error": str(e), "duration": time.monotonic() - started}
+                
+        async def run_team(team_name: str, task: str) -> Dict[str, Any]:
+            # Sub-societies take budget slots for their own teams, not for themselves
+            if isinstance(self.inner_teams[team_name], SoMArchitecture):
+                return await attempt(team_name, task)
+            async with budget.async_slot():
+                return await attempt(team_name, task)
+                    
+        for team_name in tasks:
+            if team_name not in self.inner_teams:
+                raise KeyError(f"Inner team '{team_name}' is not registered")
+        watcher = asyncio.ensure_future(watch_cancellation())
+        try:
+            outcomes = await asyncio.gather(*(run_team(name, task) for name, task in tasks.items()))
+        finally:
+            watcher.cancel()
+        return dict(zip(tasks, outcomes))
+        
+    def run_pipeline(self, team_tasks: Dict[str, str], coordination_task: str,
+                     concurrent: bool = True, team_types: Optional[Dict[str, str]] = None,
+                     cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Run inner team tasks followed by outer coordination, without the demo narration"""
+        team_types = team_types or {}
+        for team_name in team_tasks:
+            if team_name not in self.inner_teams:
+                self.register_inner_team(team_name, self.create_inner_team(team_name, team_types.get(team_name)))
+                
+        if concurrent:
+            inner_results = self.execute_inner_teams(team_tasks, cancel_event=cancel_event)
+        else:
+            inner_results = {}
+            for team_name, task in team_tasks.items():
+                started = time.monotonic()
+                try:
+                    output = self.inner_teams[team_name].execute_workflow(task, cancel_event=cancel_event or self.cancel_event)
+                    inner_results[team_name] = {"status": "completed", "result": output,
+                                                "duration": time.monotonic() - started}
+                except Exception as e:
+                    inner_results[team_name] = {"status": "error", "error": str(e),
+                                                "duration": time.monotonic() - started}
+                    
+        digests = {team_name: result["result"] for team_name, result in inner_results.items()
+                   if result["status"] == "completed" and result.get("result") is not None}
+        outer_team = self.outer_team or self.create_outer_team()
+        started = time.monotonic()
+        coordination = {"status": "skipped", "duration": 0.0}
+        if outer_team and not (self.cancel_event.is_set() or (cancel_event is not None and cancel_event.is_set())):
+            try:
+                digest = outer_team.execute_coordination(coordination_task, digests, cancel_event=cancel_event)
+                coordination = {"status": "completed", "result": digest,
+                                "duration": time.monotonic() - started}
+            except Exception as e:
+                coordination = {"status": "error", "error": str(e), "duration": time.monotonic() - started}
+                
+        return {"inner_teams": inner_results, "coordination": coordination}
+        
+    def execute_workflow(self, task: str, cancel_event: Optional[threading.Event] = None) -> Optional[TeamDigest]:
+        """Run this whole society as one inner team of a parent society"""
+        started = time.monotonic()
+        outcome = self.run_pipeline({team_name: task for team_name in self.inner_teams}, task,
+                                    cancel_event=cancel_event)
+        return self._society_digest(task, outcome, started)
+        
+    async def a_run_pipeline(self, team_tasks: Dict[str, str], coordination_task: str,
+                             concurrent: bool = True, team_types: Optional[Dict[str, str]] = None,
+                             cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Async variant of run_pipeline: teams run on the event loop, so parked gates hold no thread"""
+        team_types = team_types or {}
+        for team_name in team_tasks:
+            if team_name not in self.inner_teams:
+                self.register_inner_team(team_name, self.create_inner_team(team_name, team_types.get(team_name)))
+                
+        if concurrent:
+            inner_results = await self.a_execute_inner_teams(team_tasks, cancel_event=cancel_event)
+        else:
+            inner_results = {}
+            for team_name, task in team_tasks.items():
+                started = time.monotonic()
+                try:
+                    output = await self.inner_teams[team_name].a_execute_workflow(
+                        task, cancel_event=cancel_event or self.cancel_event)
+                    inner_results[team_name] = {"status": "completed", "result": output,
+                                                "duration": time.monotonic() - started}
+                except Exception as e:
+                    inner_results[team_name] = {"status": "error", "error": str(e),
+                                                "duration": time.monotonic() - started}
+                    
+        digests = {team_name: result["result"] for team_name, result in inner_results.items()
+                   if result["status"] == "completed" and result.get("result") is not None}
+        outer_team = self.outer_team or self.create_outer_team()
+        started = time.monotonic()
+        coordination = {"status": "skipped", "duration": 0.0}
+        if outer_team and not (self.cancel_event.is_set() or (cancel_event is not None and cancel_event.is_set())):
+            try:
+                digest = await outer_team.a_execute_coordination(coordination_task, digests, cancel_event=cancel_event)
+                coordination = {"status": "completed", "result": digest,
+                                "duration": time.monotonic() - started}
+            except Exception as e:
+                coordination = {"status": "error", "error": str(e), "duration": time.monotonic() - started}
+                
+        return {"inner_teams": inner_results, "coordination": coordination}
+        
+    async def a_execute_workflow(self, task: str,
+                                 cancel_event: Optional[threading.Event] = None) -> Optional[TeamDigest]:
+        """Async variant of execute_workflow built on a_run_pipeline"""
+        started = time.monotonic()
+        outcome = await self.a_run_pipeline({team_name: task for team_name in self.inner_teams}, task,
+                                            cancel_event=cancel_event)
+        return self._society_digest(task, outcome, started)
+        
+    def _society_digest(self, task: str, outcome: Dict[str, Any], started: float) -> Optional[TeamDigest]:
+        """Coordination digest relabelled as this society, with token totals for the whole subtree"""
+        digest = outcome["coordination"].get("result")
+        if digest is None:
+            return None
+        inner = [result["result"] for result in outcome["inner_teams"].values() if result.get("result") is not None]
+        return TeamDigest(self.name, task, digest.decision, digest.key_findings, digest.final_output,
+                          rounds=digest.rounds + sum(d.rounds for d in inner),
+                          prompt_tokens=digest.prompt_tokens + sum(d.prompt_tokens for d in inner),
+                          completion_tokens=digest.completion_tokens + sum(d.completion_tokens for d in inner),
+                          duration=time.monotonic() - started, stop_reason=digest.stop_reason,
+                          rounds_saved=digest.rounds_saved + sum(d.rounds_saved for d in inner))
+        
+    def demonstrate_som_workflow(self, concurrent: bool = False):
         """Demonstrate complete Society of Mind workflow"""
         print("🏗️ Microsoft AutoGen Society of Mind Demo")
         print("=" * 50)
         print("🚀 Setting up Society of Mind Architecture...")
         
         # Create inner teams
-        research_team = InnerTeamManager("Research_Team", self.config_list)
+        research_team = self.create_inner_team("Research_Team")
         self.register_inner_team("Research_Team", research_team)
         
-        development_team = InnerTeamManager("Development_Team", self.config_list)
+        development_team = self.create_inner_team("Development_Team")
         self.register_inner_team("Development_Team", development_team)
         
         # Create outer coordination
@@ -87,8 +2017,18 @@ class SoMArchitecture:
         
         # Execute workflows
         if AUTOGEN_AVAILABLE:
-            research_team.execute_workflow(research_task)
-            development_team.execute_workflow(development_task)
+            if concurrent:
+                results = self.execute_inner_teams({
+                    "Research_Team": research_task,
+                    "Development_Team": development_task
+                })
+                digests = {team_name: result["result"] for team_name, result in results.items()
+                           if result.get("result") is not None}
+            else:
+                digests = {
+                    "Research_Team": research_team.execute_workflow(research_task),
+                    "Development_Team": development_team.execute_workflow(development_task)
+                }
             
             # Outer team coordination
             coordination_task = """
@@ -97,7 +2037,7 @@ class SoMArchitecture:
     """
             
             if outer_team:
-                outer_team.execute_coordination(coordination_task)
+                outer_team.execute_coordination(coordination_task, digests)
         
         # Generate report
         return self._generate_workflow_report()
@@ -106,9 +2046,7 @@ class SoMArchitecture:
         """Generate comprehensive workflow report"""
         report = {
             "som_architecture_summary": {
-                "total_workflows": len(self.workflow_log),
-                "inner_team_workflows": len([w for w in self.workflow_log if w.get('level') != 'outer_team']),
-                "outer_team_workflows": len([w for w in self.workflow_log if w.get('level') == 'outer_team']),
+                **self.workflow_log.summary(),
                 "human_intervention_points": [
                     "Task initiation approval",
                     "Milestone reviews",
@@ -117,7 +2055,8 @@ class SoMArchitecture:
                     "Strategic direction guidance"
                 ]
             },
-            "workflow_log": self.workflow_log,
+            "workflow_log": self.workflow_log.recent(self.REPORT_LOG_ENTRIES),
+            "instrumentation": self.metrics.summary() if self.metrics else {},
             "architecture_benefits": [
                 "Human oversight at critical decision points",
                 "Multi-level decision making (inner and outer teams)",
@@ -135,168 +2074,307 @@ class SoMArchitecture:
         return report
 
 
-class InnerTeamManager:
-    """Manages inner team operations with UserProxyAgent integration"""
+class TeamManager:
+    """
+    Shared machinery of InnerTeamManager and OuterTeamManager: lease, run and digest a team chat
+    Subclasses supply the announcement, opening message and logging (LEVEL, STARTED_ACTION, FAILED_NOTE)
+    """
     
-    def __init__(self, team_name: str, config_list: List[Dict]):
+    LEVEL = "inner_team"
+    STARTED_ACTION = "workflow_start"
+    FAILED_NOTE = "Workflow execution completed with human intervention"
+    
+    def __init__(self, team_name: str, config_list: List[Dict],
+                 registry: Optional[TeamRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 approval_broker: Optional["ApprovalBroker"] = None,
+                 metrics: Optional[WorkflowMetrics] = None,
+                 max_round: int = 8,
+                 compaction: Optional[CompactionPolicy] = None,
+                 speaker_graph: Optional[Dict[str, List[str]]] = None,
+                 team_type: Optional[str] = None,
+                 specs: Optional[TeamSpecRegistry] = None,
+                 termination: Optional[TerminationPolicy] = None,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 max_retries: int = 2):
         self.team_name = team_name
+        self.checkpoints = checkpoints
+        self.max_retries = max_retries
+        self.termination = termination if termination is not None else TerminationPolicy()
+        self.team_type = team_type
+        self.specs = specs or team_specs
+        self.max_round = max_round
+        self.compaction = compaction
+        self.speaker_graph = speaker_graph
         self.config_list = config_list
+        self.registry = registry or team_registry
+        self.response_cache = response_cache
+        self.approval_broker = approval_broker
+        self.metrics = metrics
         self.agents = {}
-        self.human_agent = None
+        self._spec = None
         
-    def create_research_team(self):
-        """Create research team with specialized agents"""
+    @property
+    def spec(self) -> TeamSpec:
+        """Team spec for this team: the explicit team_type, else matched by team name"""
+        if self._spec is None:
+            self._spec = (self.specs.get(self.team_type) if self.team_type
+                          else self.specs.resolve(self.team_name))
+        return self._spec
+        
+    def create_team(self, spec: Optional[TeamSpec] = None):
+        """Create this team's agents from its spec"""
         if not AUTOGEN_AVAILABLE:
             return {}
             
-        # Research Analyst
-        research_analyst = autogen.AssistantAgent(
-            name="Research_Analyst",
-            system_message="""You are a Research Analyst specialized in market research and competitive analysis.
-            Your role is to gather data, analyze market trends, and provide insights for strategic decision making.
-            Work collaboratively with other team members and seek human approval for key decisions.""",
-            llm_config={"config_list": self.config_list}
-        )
-        
-        # Data Validator
-        data_validator = autogen.AssistantAgent(
-            name="Data_Validator", 
-            system_message="""You are a Data Validator responsible for ensuring data accuracy and reliability.
-            Verify information sources, check for biases, and validate analytical conclusions.
-            Collaborate with the research team and escalate concerns to human oversight.""",
-            llm_config={"config_list": self.config_list}
-        )
-        
-        # Strategy Advisor
-        strategy_advisor = autogen.AssistantAgent(
-            name="Strategy_Advisor",
-            system_message="""You are a Strategy Advisor who transforms research insights into actionable recommendations.
-            Analyze market data for strategic implications and propose implementation strategies.
-            Ensure all recommendations align with business objectives and seek human validation.""",
-            llm_config={"config_list": self.config_list}
-        )
+        self.agents = (spec or self.spec).build_agents(self.team_name, self.config_list, self.specs)
+        return self.agents
         
-        # Human Proxy for Inner Team
-        human_proxy = autogen.UserProxyAgent(
-            name=f"{self.team_name}_Human",
-            system_message=f"""You are the human supervisor for the {self.team_name}.
-            Your role is to provide oversight, approve key decisions, and guide the team's direction.
-            You have the authority to approve, modify, or reject agent recommendations.""",
-            human_input_mode="ALWAYS",
-            max_consecutive_auto_reply=0,
-            code_execution_config=False
-        )
+    def execute(self, task: str, message: str, cancel_event: Optional[threading.Event] = None,
+                on_event=None, stream_tokens: bool = False) -> Optional[TeamDigest]:
+        """Lease the team, run its chat from message and return the digest (None if nothing ran)"""
+        team = self._lease_team(task, cancel_event, on_event, stream_tokens)
+        if team is None:
+            return
+            
+        try:
+            usage, started = team.usage(), time.monotonic()
+            self._run(team, task, message)
+            return self._digest(team, task, usage, started)
+        finally:
+            self.registry.release(team)
+            
+    async def a_execute(self, task: str, message: str, cancel_event: Optional[threading.Event] = None,
+                        on_event=None, stream_tokens: bool = False) -> Optional[TeamDigest]:
+        """Async variant of execute; human gates park on the approval broker without a thread"""
+        team = self._lease_team(task, cancel_event, on_event, stream_tokens)
+        if team is None:
+            return
+            
+        try:
+            usage, started = team.usage(), time.monotonic()
+            await self._a_run(team, task, message)
+            return self._digest(team, task, usage, started)
+        finally:
+            self.registry.release(team)
+            
+    async def stream(self, execute, cancel_event: Optional[threading.Event] = None, stream_tokens: bool = True):
+        """Async generator of execute()'s WorkflowEvents, ending with workflow_end carrying the TeamDigest"""
+        cancel_event = cancel_event or threading.Event()
         
-        self.agents = {
-            "research_analyst": research_analyst,
-            "data_validator": data_validator, 
-            "strategy_advisor": strategy_advisor,
-            "human_proxy": human_proxy
-        }
+        def run(on_event):
+            return execute(cancel_event, on_event=on_event, stream_tokens=stream_tokens)
+            
+        async for event in stream_events(run, cancel_event):
+            yield event
+            
+    def _announce(self, task: str):
+        """Print the start of a run and the team's intervention points"""
+        raise NotImplementedError
         
-        return self.agents
+    def _digest(self, team: PooledTeam, task: str, usage: Dict[str, int], started: float) -> TeamDigest:
+        """Summarise the finished chat of a leased team"""
+        tokens = {field: value - usage[field] for field, value in team.usage().items()}
+        digest = TeamDigest.from_chat(self.team_name, task, team.chat_manager.groupchat.messages,
+                                      team.agents[self.spec.gate].name, tokens, time.monotonic() - started,
+                                      team.runtime.get("stop_reason"), self.max_round)
+        _report_early_stop(digest, self.metrics, self.max_round)
+        _emit(team.runtime, "workflow_end", round=len(team.group_chat.messages),
+              content=digest.final_output, digest=digest)
+        return digest
         
-    def create_development_team(self):
-        """Create development team with specialized agents"""
+    def _lease_team(self, task: str, cancel_event: Optional[threading.Event],
+                    on_event=None, stream_tokens: bool = False) -> Optional[PooledTeam]:
+        """Announce the run and lease a cached team for it, or None when there is nothing to run"""
+        if cancel_event is not None and cancel_event.is_set():
+            print(f"🛑 {self.team_name} workflow cancelled before start")
+            return
+            
+        self._announce(task)
         if not AUTOGEN_AVAILABLE:
-            return {}
+            print(f"Demo mode: {self.team_name} workflow simulation completed")
+            return
             
-        # Technical Architect
-        technical_architect = autogen.AssistantAgent(
-            name="Technical_Architect",
-            system_message="""You are a Technical Architect responsible for system design and architecture decisions.
-            Design scalable, robust systems and recommend appropriate technology stacks.
-            Collaborate with implementation and QA teams, seeking human approval for major decisions.""",
-            llm_config={"config_list": self.config_list}
-        )
+        if cancel_event is not None and cancel_event.is_set():
+            print(f"🛑 {self.team_name} workflow cancelled before chat start")
+            return
+            
+        # Lease a cached roster and group chat for this team; an empty graph means LLM selection
+        spec = self.spec
+        graph = spec.speaker_graph if self.speaker_graph is None else self.speaker_graph
+        key = (spec.team_type, self.team_name, self.max_round, config_fingerprint(self.config_list),
+               json.dumps(graph, sort_keys=True))
+        team = self.registry.acquire(key, lambda: self._build_team(key, spec, graph))
+        team.bind(team=self.team_name, response_cache=self.response_cache,
+                  approval_broker=self.approval_broker, metrics=self.metrics,
+                  compaction=self.compaction, cancel_event=cancel_event,
+                  events=on_event, stream_tokens=stream_tokens,
+                  termination=self.termination, gate=team.agents[spec.gate].name,
+                  round_budget=self.termination.round_budget(task, len(team.agents), self.max_round),
+                  checkpoints=self.checkpoints)
+        self.agents = team.agents
+        _emit(team.runtime, "workflow_start", content=task)
+        return team
         
-        # Implementation Planner
-        implementation_planner = autogen.AssistantAgent(
-            name="Implementation_Planner",
-            system_message="""You are an Implementation Planner who creates detailed project roadmaps.
-            Break down complex projects into manageable phases and estimate resources needed.
-            Coordinate with technical and QA teams, ensuring human oversight of planning decisions.""",
-            llm_config={"config_list": self.config_list}
+    def _build_team(self, key: tuple, spec: TeamSpec, graph: Dict[str, List[str]]) -> PooledTeam:
+        """Construct agents plus their group chat and manager"""
+        agents = self.create_team(spec)
+        for agent in agents.values():
+            install_runtime_reply(agent)
+        install_approval_gate(agents[spec.gate], self.team_name)
+        
+        group_chat = autogen.GroupChat(
+            agents=list(agents.values()),
+            messages=[],
+            max_round=self.max_round,
+            **(SpeakerGraph(graph, agents, spec.terminal_roles).group_chat_kwargs() if graph else {})
         )
+        install_round_instrumentation(group_chat, self.team_name)
+        install_history_compaction(agents, group_chat)
+        install_event_stream(agents, group_chat)
         
-        # Quality Assurance
-        quality_assurance = autogen.AssistantAgent(
-            name="Quality_Assurance",
-            system_message="""You are a Quality Assurance specialist ensuring high standards throughout development.
-            Define quality criteria, review technical specifications, and recommend improvements.
-            Work with the development team and escalate quality concerns to human oversight.""",
+        chat_manager = autogen.GroupChatManager(
+            groupchat=group_chat,
             llm_config={"config_list": self.config_list}
         )
         
-        # Human Proxy for Development Team
-        human_proxy = autogen.UserProxyAgent(
-            name=f"{self.team_name}_Human",
-            system_message=f"""You are the human supervisor for the {self.team_name}.
-            Your role is to provide technical oversight, approve architectural decisions, and ensure quality standards.
-            You have the authority to approve, modify, or reject technical recommendations.""",
-            human_input_mode="ALWAYS",
-            max_consecutive_auto_reply=0,
-            code_execution_config=False
-        )
+        return PooledTeam(key, agents, group_chat, chat_manager)
         
-        self.agents = {
-            "technical_architect": technical_architect,
-            "implementation_planner": implementation_planner,
-            "quality_assurance": quality_assurance,
-            "human_proxy": human_proxy
-        }
+    def _run(self, team: PooledTeam, task: str, message: str):
+        """Run the leased team's chat from its gate's message, resuming it after failed rounds"""
+        try:
+            run_resumable_chat(team, team.agents[self.spec.gate], message, self.max_retries)
+            self._log_start(task)
+        except Exception as e:
+            team.runtime["stop_reason"] = "error"
+            print(f"{self.FAILED_NOTE}: {str(e)}")
+            
+    async def _a_run(self, team: PooledTeam, task: str, message: str):
+        """Async counterpart of _run"""
+        try:
+            await a_run_resumable_chat(team, team.agents[self.spec.gate], message, self.max_retries)
+            self._log_start(task)
+        except Exception as e:
+            team.runtime["stop_reason"] = "error"
+            print(f"{self.FAILED_NOTE}: {str(e)}")
+            
+    def _log_start(self, task: str):
+        """Record the run in the parent SoM architecture log"""
+        if hasattr(self, 'parent_som'):
+            self.parent_som.workflow_log.record(self.team_name, self.STARTED_ACTION, self.LEVEL, task)
+
+
+class InnerTeamManager(TeamManager):
+    """Manages inner team operations with UserProxyAgent integration"""
+    
+    def __init__(self, team_name: str, config_list: List[Dict],
+                 registry: Optional[TeamRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 approval_broker: Optional["ApprovalBroker"] = None,
+                 metrics: Optional[WorkflowMetrics] = None,
+                 max_round: int = 8,
+                 compaction: Optional[CompactionPolicy] = None,
+                 speaker_graph: Optional[Dict[str, List[str]]] = None,
+                 team_type: Optional[str] = None,
+                 specs: Optional[TeamSpecRegistry] = None,
+                 termination: Optional[TerminationPolicy] = None,
+                 task_index: Optional[TaskIndex] = None,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 max_retries: int = 2):
+        super().__init__(team_name, config_list, registry, response_cache, approval_broker, metrics,
+                         max_round, compaction, speaker_graph, team_type, specs, termination,
+                         checkpoints, max_retries)
+        self.task_index = task_index
+        self.human_agent = None
         
-        return self.agents
+    def create_research_team(self):
+        """Create research team with specialized agents"""
+        return self.create_team(self.specs.get("research"))
+        
+    def create_development_team(self):
+        """Create development team with specialized agents"""
+        return self.create_team(self.specs.get("development"))
+        
+    def execute_workflow(self, task: str, cancel_event: Optional[threading.Event] = None,
+                         on_event=None, stream_tokens: bool = False) -> Optional[TeamDigest]:
+        """Execute inner team workflow with human oversight and return its digest"""
+        reused, seed = self._check_index(task)
+        if reused is not None:
+            return self._announce_reused(task, reused, on_event)
+        digest = self.execute(task, self._approval_message(task, seed), cancel_event, on_event, stream_tokens)
+        return self._index(task, digest, cancel_event)
         
-    def execute_workflow(self, task: str):
-        """Execute inner team workflow with human oversight"""
+    async def a_execute_workflow(self, task: str, cancel_event: Optional[threading.Event] = None,
+                                 on_event=None, stream_tokens: bool = False) -> Optional[TeamDigest]:
+        """Async variant of execute_workflow; human gates park on the approval broker without a thread"""
+        reused, seed = self._check_index(task)
+        if reused is not None:
+            return self._announce_reused(task, reused, on_event)
+        digest = await self.a_execute(task, self._approval_message(task, seed), cancel_event, on_event,
+                                      stream_tokens)
+        return self._index(task, digest, cancel_event)
+        
+    async def stream_workflow(self, task: str, cancel_event: Optional[threading.Event] = None,
+                              stream_tokens: bool = True):
+        """Async generator of this workflow's WorkflowEvents while the chat runs (see TeamManager.stream)"""
+        run = lambda *args, **kwargs: self.execute_workflow(task, *args, **kwargs)
+        async for event in self.stream(run, cancel_event, stream_tokens):
+            yield event
+            
+    def _announce(self, task: str):
         print(f"\n🔄 Starting Inner Team Workflow: {self.team_name}")
         print(f"Task: {task}")
         
-        # Create appropriate team based on name
-        if "Research" in self.team_name:
-            agents = self.create_research_team()
-            intervention_points = [
-                "Task initiation approval",
-                "Intermediate milestone reviews", 
-                "Final output validation",
-                "Resource requirement approval"
-            ]
-        else:
-            agents = self.create_development_team()
-            intervention_points = [
-                "Task initiation approval",
-                "Intermediate milestone reviews",
-                "Final output validation", 
-                "Resource requirement approval"
-            ]
-            
         print(f"\n📋 Human intervention points for {self.team_name}:")
-        for i, point in enumerate(intervention_points, 1):
+        for i, point in enumerate(self.spec.intervention_points, 1):
             print(f"{i}. {point}")
             
-        if not AUTOGEN_AVAILABLE or not agents:
-            print(f"Demo mode: {self.team_name} workflow simulation completed")
-            return
+    def _check_index(self, task: str) -> Tuple[Optional[TeamDigest], Optional[TeamDigest]]:
+        """(digest to return instead of running, prior digest to seed the chat with) from the task index"""
+        if self.task_index is None:
+            return None, None
+        prior, score = self.task_index.lookup(self.spec.team_type, task)
+        if prior is None:
+            return None, None
+        if score < self.task_index.threshold:
+            print(f"🌱 {self.team_name}: seeding the chat with a related earlier result (similarity {score:.2f})")
+            return None, prior
             
-        # Create group chat for coordination
-        agents_list = list(agents.values())
-        group_chat = autogen.GroupChat(
-            agents=agents_list,
-            messages=[],
-            max_round=8
-        )
+        print(f"♻️ {self.team_name}: reusing the result of a near-identical task (similarity {score:.2f})")
+        if self.metrics is not None:
+            self.metrics.inc("som_task_index_hits_total", team=self.team_name, agent="task_index")
+            self.metrics.inc("som_rounds_saved_total", self.max_round, team=self.team_name,
+                             agent="chat_manager", reason="reused")
+        return TeamDigest(self.team_name, task, prior.decision, prior.key_findings, prior.final_output,
+                          stop_reason="reused", rounds_saved=self.max_round), None
         
-        chat_manager = autogen.GroupChatManager(
-            groupchat=group_chat,
-            llm_config={"config_list": self.config_list}
-        )
+    def _announce_reused(self, task: str, digest: TeamDigest, on_event) -> TeamDigest:
+        """Emit the workflow_start/workflow_end pair for a digest served from the task index"""
+        runtime = {"team": self.team_name, "events": on_event}
+        _emit(runtime, "workflow_start", content=task)
+        _emit(runtime, "workflow_end", content=digest.final_output, digest=digest)
+        return digest
         
-        # Execute workflow with human oversight
-        human_proxy = agents["human_proxy"]
+    def _index(self, task: str, digest: TeamDigest, cancel_event: Optional[threading.Event]) -> TeamDigest:
+        """Add a finished, unrejected and uncancelled result with some output to the task index"""
+        if digest is None:
+            return None
+        cancelled = cancel_event is not None and cancel_event.is_set()
+        usable = digest.stop_reason != "error" and digest.final_output and digest.decision != "REJECT"
+        if self.task_index is not None and usable and not cancelled:
+            self.task_index.add(self.spec.team_type, task, digest)
+        return digest
         
-        # Human approval prompt
-        approval_message = f"""
+    def _approval_message(self, task: str, seed: Optional[TeamDigest] = None) -> str:
+        """Human approval prompt that opens the team chat, with a related earlier result if any"""
+        prior = ""
+        if seed is not None:
+            prior = f"""
+            Earlier result for a closely related task (reuse what still applies):
+            
+{seed.render()}
+            """
+        return f"""
             HUMAN APPROVAL REQUIRED:
             
             Task: {task}
@@ -310,128 +2388,75 @@ class InnerTeamManager:
             3. REJECT - Stop the task and provide alternative direction
             
             What is your decision?
-            """
-            
-        try:
-            human_proxy.initiate_chat(
-                chat_manager,
-                message=approval_message
-            )
-            
-            # Log workflow
-            workflow_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "team": self.team_name,
-                "action": "workflow_start",
-                "task": task
-            }
-            
-            # Access parent SoM architecture to log
-            if hasattr(self, 'parent_som'):
-                self.parent_som.workflow_log.append(workflow_entry)
-                
-        except Exception as e:
-            print(f"Workflow execution completed with human intervention: {str(e)}")
+            {prior}"""
 
 
-class OuterTeamManager:
+class OuterTeamManager(TeamManager):
     """Manages outer team coordination with executive oversight"""
     
-    def __init__(self, config_list: List[Dict]):
-        self.config_list = config_list
-        self.agents = {}
-        
+    LEVEL = "outer_team"
+    STARTED_ACTION = "coordination_start"
+    FAILED_NOTE = "Executive coordination completed"
+    
+    def __init__(self, config_list: List[Dict], registry: Optional[TeamRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 approval_broker: Optional["ApprovalBroker"] = None,
+                 metrics: Optional[WorkflowMetrics] = None,
+                 max_round: int = 8,
+                 compaction: Optional[CompactionPolicy] = None,
+                 speaker_graph: Optional[Dict[str, List[str]]] = None,
+                 team_type: str = "coordination",
+                 specs: Optional[TeamSpecRegistry] = None,
+                 termination: Optional[TerminationPolicy] = None,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 max_retries: int = 2):
+        super().__init__("Outer_Team", config_list, registry, response_cache, approval_broker, metrics,
+                         max_round, compaction, speaker_graph, team_type, specs, termination,
+                         checkpoints, max_retries)
+                         
     def create_coordination_team(self):
         """Create outer coordination team"""
-        if not AUTOGEN_AVAILABLE:
-            return {}
-            
-        # Team Coordinator
-        team_coordinator = autogen.AssistantAgent(
-            name="Team_Coordinator",
-            system_message="""You are a Team Coordinator responsible for inter-team communication and workflow management.
-            Coordinate between research and development teams, resolve dependencies, and ensure alignment.
-            Escalate strategic decisions to executive oversight and maintain project timelines.""",
-            llm_config={"config_list": self.config_list}
-        )
-        
-        # Resource Manager
-        resource_manager = autogen.AssistantAgent(
-            name="Resource_Manager", 
-            system_message="""You are a Resource Manager responsible for optimizing resource allocation across teams.
-            Monitor resource utilization, identify bottlenecks, and recommend reallocation strategies.
-            Ensure efficient use of resources and escalate resource conflicts to executive level.""",
-            llm_config={"config_list": self.config_list}
-        )
+        return self.create_team()
         
-        # Output Validator
-        output_validator = autogen.AssistantAgent(
-            name="Output_Validator",
-            system_message="""You are an Output Validator ensuring integration and quality of team deliverables.
-            Review outputs from multiple teams, validate integration requirements, and ensure consistency.
-            Provide final quality assurance before executive approval.""",
-            llm_config={"config_list": self.config_list}
-        )
-        
-        # Executive Supervisor (Human)
-        executive_supervisor = autogen.UserProxyAgent(
-            name="Executive_Supervisor",
-            system_message="""You are the Executive Supervisor with strategic oversight authority.
-            Your role is to make high-level strategic decisions, resolve inter-team conflicts, and provide final approval.
-            You have ultimate authority over project direction and resource allocation.""",
-            human_input_mode="ALWAYS",
-            max_consecutive_auto_reply=0,
-            code_execution_config=False
-        )
-        
-        self.agents = {
-            "team_coordinator": team_coordinator,
-            "resource_manager": resource_manager,
-            "output_validator": output_validator,
-            "executive_supervisor": executive_supervisor
-        }
-        
-        return self.agents
+    def execute_coordination(self, task: str, digests: Optional[Dict[str, TeamDigest]] = None,
+                             cancel_event: Optional[threading.Event] = None,
+                             on_event=None, stream_tokens: bool = False) -> Optional[TeamDigest]:
+        """Execute outer team coordination with executive oversight, building on the inner team digests"""
+        return self.execute(task, self._executive_message(task, digests), cancel_event, on_event, stream_tokens)
         
-    def execute_coordination(self, task: str):
-        """Execute outer team coordination with executive oversight"""
+    async def a_execute_coordination(self, task: str, digests: Optional[Dict[str, TeamDigest]] = None,
+                                     cancel_event: Optional[threading.Event] = None,
+                                     on_event=None, stream_tokens: bool = False) -> Optional[TeamDigest]:
+        """Async variant of execute_coordination; executive gates park on the approval broker"""
+        return await self.a_execute(task, self._executive_message(task, digests), cancel_event, on_event,
+                                    stream_tokens)
+                                    
+    async def stream_coordination(self, task: str, digests: Optional[Dict[str, TeamDigest]] = None,
+                                  cancel_event: Optional[threading.Event] = None, stream_tokens: bool = True):
+        """Async generator of the coordination chat's WorkflowEvents, as InnerTeamManager.stream_workflow"""
+        run = lambda *args, **kwargs: self.execute_coordination(task, digests, *args, **kwargs)
+        async for event in self.stream(run, cancel_event, stream_tokens):
+            yield event
+            
+    def _announce(self, task: str):
         print(f"\n🎯 Starting Outer Team Coordination")
         print(f"Coordination Task: {task}")
         
-        intervention_points = [
-            "Strategic direction approval",
-            "Inter-team conflict resolution",
-            "Resource allocation decisions",
-            "Final deliverable validation"
-        ]
-        
         print(f"\n🎭 Executive intervention points:")
-        for i, point in enumerate(intervention_points, 1):
+        for i, point in enumerate(self.spec.intervention_points, 1):
             print(f"{i}. {point}")
             
-        agents = self.create_coordination_team()
-        
-        if not AUTOGEN_AVAILABLE or not agents:
-            print("Demo mode: Outer team coordination simulation completed")
-            return
+    def _executive_message(self, task: str, digests: Optional[Dict[str, TeamDigest]] = None) -> str:
+        """Executive decision prompt that opens the coordination chat"""
+        inner_results = ""
+        if digests:
+            rendered = "\n\n".join(digest.render() for digest in digests.values() if digest is not None)
+            inner_results = f"""
+            Inner team results (build on these rather than repeating their analysis):
             
-        # Create group chat for executive coordination
-        agents_list = list(agents.values())
-        group_chat = autogen.GroupChat(
-            agents=agents_list,
-            messages=[],
-            max_round=8
-        )
-        
-        chat_manager = autogen.GroupChatManager(
-            groupchat=group_chat,
-            llm_config={"config_list": self.config_list}
-        )
-        
-        # Executive decision prompt
-        executive_supervisor = agents["executive_supervisor"]
-        
-        executive_message = f"""
+{rendered}
+            """
+        return f"""
             EXECUTIVE DECISION REQUIRED:
             
             Coordination Task: {task}
@@ -445,26 +2470,29 @@ class OuterTeamManager:
             4. Success criteria and validation methods
             
             Provide your executive guidance and approval to proceed.
-            """
-            
-        try:
-            executive_supervisor.initiate_chat(
-                chat_manager,
-                message=executive_message
-            )
-            
-        except Exception as e:
-            print(f"Executive coordination completed: {str(e)}")
+            {inner_results}"""
 
 
 class SoMWorkflowManager:
     """Orchestrates complete Society of Mind workflows"""
     
-    def __init__(self, config_list: List[Dict]):
+    def __init__(self, config_list: List[Dict], response_cache: Optional[ResponseCache] = None,
+                 approval_broker: Optional[ApprovalBroker] = None,
+                 metrics: Optional[WorkflowMetrics] = None,
+                 audit_log: Optional[AuditLog] = None,
+                 compaction: Optional[Dict[str, CompactionPolicy]] = None,
+                 termination: Optional[TerminationPolicy] = None,
+                 task_index: Optional[TaskIndex] = None,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 max_retries: int = 2):
         self.config_list = config_list
-        self.som_architecture = SoMArchitecture(config_list)
+        self.som_architecture = SoMArchitecture(config_list, response_cache=response_cache,
+                                                approval_broker=approval_broker, metrics=metrics,
+                                                audit_log=audit_log, compaction=compaction,
+                                                termination=termination, task_index=task_index,
+                                                checkpoints=checkpoints, max_retries=max_retries)
         
-    def demonstrate_complete_workflow(self):
+    def demonstrate_complete_workflow(self, concurrent: bool = False):
         """Demonstrate complete SoM workflow with all intervention points"""
         
         # Set up parent reference for logging
@@ -475,11 +2503,147 @@ class SoMWorkflowManager:
         development_team.parent_som = self.som_architecture
         
         # Execute demonstration
-        return self.som_architecture.demonstrate_som_workflow()
+        return self.som_architecture.demonstrate_som_workflow(concurrent=concurrent)
+        
+    def run_task(self, task_id: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one task spec through the SoM pipeline and return its result record"""
+        started = time.monotonic()
+        record = {"task_id": task_id}
+        try:
+            team_tasks = spec.get("teams")
+            if not team_tasks:
+                if "research_task" not in spec or "development_task" not in spec:
+                    raise ValueError("task spec needs 'teams' or both 'research_task' and 'development_task'")
+                team_tasks = {
+                    "Research_Team": spec["research_task"],
+                    "Development_Team": spec["development_task"]
+                }
+            som = SoMArchitecture(self.config_list, response_cache=self.som_architecture.response_cache,
+                                  approval_broker=self.som_architecture.approval_broker,
+                                  metrics=self.som_architecture.metrics,
+                                  audit_log=self.som_architecture.workflow_log,
+                                  compaction=self.som_architecture.compaction,
+                                  max_round=spec.get("max_round", self.som_architecture.max_round),
+                                  termination=self.som_architecture.termination,
+                                  task_index=self.som_architecture.task_index,
+                                  checkpoints=self.som_architecture.checkpoints,
+                                  max_retries=self.som_architecture.max_retries)
+            outcome = som.run_pipeline(team_tasks, spec.get("coordination_task", ""),
+                                       team_types=spec.get("team_types"))
+            failed = [name for name, result in outcome["inner_teams"].items()
+                      if result["status"] != "completed"]
+            if outcome["coordination"]["status"] == "error":
+                failed.append("outer_team")
+            record["status"] = "failed" if failed else "completed"
+            record.update(outcome)
+        except Exception as e:
+            record["status"] = "failed"
+            record["error"] = str(e)
+        record["duration"] = time.monotonic() - started
+        record["finished_at"] = datetime.now().isoformat()
+        return record
+        
+    def process_pool(self, processes: Optional[int] = None, **options):
+        """WorkflowProcessPool sharing this manager's config and runtime services"""
+        from som_pool import WorkflowProcessPool
+        
+        som = self.som_architecture
+        return WorkflowProcessPool(self.config_list, processes, response_cache=som.response_cache,
+                                   approval_broker=som.approval_broker, metrics=som.metrics,
+                                   audit_log=som.workflow_log, compaction=som.compaction,
+                                   termination=som.termination, task_index=som.task_index,
+                                   checkpoints=som.checkpoints, max_retries=som.max_retries, **options)
+        
+    def run_batch(self, input_path: str, output_path: str, workers: int = 4,
+                  resume: bool = True, backend: str = "thread") -> Dict[str, int]:
+        """Stream task specs from a JSONL file through the SoM pipeline on a thread or process pool"""
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown batch backend '{backend}'; use 'thread' or 'process'")
+        done = set()
+        invalid_lines = set()
+        if resume and os.path.exists(output_path):
+            with open(output_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn final line from a crash
+                    if record.get("status") == "completed":
+                        done.add(record.get("task_id"))
+                    elif record.get("invalid_line") is not None:
+                        invalid_lines.add(record["invalid_line"])
+            print(f"♻️ Resuming batch: {len(done)} tasks already completed")
+            
+        counts = {"submitted": 0, "completed": 0, "failed": 0, "skipped": 0}
+        write_lock = threading.Lock()
+        
+        def write_record(record: Dict[str, Any]):
+            with write_lock:
+                out.write(json.dumps(record, default=_json_default) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                counts["completed" if record["status"] == "completed" else "failed"] += 1
+                
+        if backend == "process":
+            pool = self.process_pool(workers)
+            submit = pool.submit
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="som-batch")
+            submit = lambda task_id, spec: pool.submit(self.run_task, task_id, spec)
+            
+        with open(input_path, "r", encoding="utf-8") as src, \
+                open(output_path, "a", encoding="utf-8") as out, pool:
+            in_flight = set()
+            try:
+                for line_no, line in enumerate(src, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        spec = json.loads(line)
+                        if not isinstance(spec, dict):
+                            raise ValueError(f"expected a JSON object, got {type(spec).__name__}")
+                    except ValueError as e:
+                        # A malformed line fails its own task, not the whole batch, and is recorded once
+                        if line_no in invalid_lines:
+                            counts["skipped"] += 1
+                            continue
+                        write_record({"task_id": str(line_no), "status": "failed", "invalid_line": line_no,
+                                      "error": f"Invalid task spec on line {line_no}: {e}",
+                                      "finished_at": datetime.now().isoformat()})
+                        continue
+                    task_id = str(spec.get("task_id", line_no))
+                    if task_id in done:
+                        counts["skipped"] += 1
+                        continue
+                        
+                    # Keep the queue bounded so huge inputs are streamed, not loaded
+                    if len(in_flight) >= workers * 2:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            write_record(future.result())
+                    in_flight.add(submit(task_id, spec))
+                    counts["submitted"] += 1
+            finally:
+                # Tasks already submitted finish either way; keep their records
+                for future in in_flight:
+                    write_record(future.result())
+                    
+        print(f"📦 Batch finished: {counts}")
+        return counts
 
 
 def create_config_list():
     """Create configuration for AutoGen agents"""
+    load_environment()
+    
+    providers = os.getenv("SOM_PROVIDERS")
+    if providers:
+        # Either inline JSON or a path to a JSON file of endpoint specs
+        if os.path.exists(providers):
+            with open(providers, "r", encoding="utf-8") as f:
+                providers = f.read()
+        return ProviderPool.from_spec(json.loads(providers)).config_list()
+        
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         print("Warning: OPENAI_API_KEY not found in environment variables")
@@ -494,8 +2658,21 @@ def create_config_list():
     ]
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Main demonstration function"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Society of Mind workflows with UserProxyAgent oversight")
+    parser.add_argument("--batch", metavar="TASKS_JSONL", help="process task specs from a JSONL file")
+    parser.add_argument("--output", metavar="RESULTS_JSONL", default="som_results.jsonl",
+                        help="where batch results are appended (default: som_results.jsonl)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent batch tasks (default: 4)")
+    parser.add_argument("--backend", choices=("thread", "process"), default="thread",
+                        help="run batch tasks on threads or on worker processes (default: thread)")
+    parser.add_argument("--no-resume", action="store_true", help="reprocess tasks already in --output")
+    args = parser.parse_args(argv)
+    load_environment()
+    
     print("🎯 Assignment 0: UserProxyAgent Integration in Society of Mind")
     print("=" * 60)
     
@@ -508,16 +2685,89 @@ def main():
         print("⚠️  Please set up your .env file with OpenAI API key")
         return
         
+    # Optional persistent LLM response cache
+    response_cache = None
+    if os.getenv("SOM_RESPONSE_CACHE"):
+        response_cache = ResponseCache(
+            os.getenv("SOM_RESPONSE_CACHE"),
+            replay=os.getenv("SOM_RESPONSE_CACHE_REPLAY", "false").lower() in ("1", "true", "yes")
+        )
+        
+    # Optional non-blocking human gates
+    approval_broker = None
+    if os.getenv("SOM_APPROVAL_FILE") or os.getenv("SOM_APPROVAL_PORT"):
+        timeout = os.getenv("SOM_APPROVAL_TIMEOUT")
+        approval_broker = ApprovalBroker(default_timeout=float(timeout) if timeout else None)
+        if os.getenv("SOM_AUTO_APPROVE"):
+            approval_broker.add_rule(os.getenv("SOM_AUTO_APPROVE"), "APPROVE")
+        if os.getenv("SOM_APPROVAL_FILE"):
+            approval_broker.watch_file(os.getenv("SOM_APPROVAL_FILE"))
+        if os.getenv("SOM_APPROVAL_PORT"):
+            host, port = approval_broker.serve(port=int(os.getenv("SOM_APPROVAL_PORT")))
+            print(f"🛎️ Approval decisions accepted on {host}:{port}")
+            
+    # Optional per-agent latency/token instrumentation
+    metrics_dir = os.getenv("SOM_METRICS_DIR")
+    metrics = WorkflowMetrics() if metrics_dir else None
+    
+    # Audit trail, optionally persisted to JSONL or SQLite
+    audit_sinks = [open_audit_sink(os.getenv("SOM_AUDIT_LOG"))] if os.getenv("SOM_AUDIT_LOG") else []
+    audit_log = AuditLog(sinks=audit_sinks)
+    
+    # Optional GroupChat history compaction for every team
+    compaction = None
+    if os.getenv("SOM_COMPACTION_WINDOW"):
+        compaction = {"default": CompactionPolicy(
+            window=int(os.getenv("SOM_COMPACTION_WINDOW")),
+            default_budget=int(os.getenv("SOM_COMPACTION_BUDGET", "4000"))
+        )}
+        
+    # Early chat termination and per-task round budgets are on unless disabled
+    termination = None
+    if os.getenv("SOM_EARLY_TERMINATION", "true").lower() in ("0", "false", "no"):
+        termination = TerminationPolicy.disabled()
+        
+    # Optional reuse of results for near-identical inner team tasks
+    task_index = None
+    if os.getenv("SOM_TASK_INDEX_THRESHOLD"):
+        seed_threshold = os.getenv("SOM_TASK_INDEX_SEED_THRESHOLD")
+        ttl = os.getenv("SOM_TASK_INDEX_TTL")
+        task_index = TaskIndex(threshold=float(os.getenv("SOM_TASK_INDEX_THRESHOLD")),
+                               seed_threshold=float(seed_threshold) if seed_threshold else None,
+                               ttl=float(ttl) if ttl else None)
+        
+    # Optional per-round chat checkpoints, so interrupted workflows resume where they stopped
+    checkpoints = CheckpointStore(os.getenv("SOM_CHECKPOINTS")) if os.getenv("SOM_CHECKPOINTS") else None
+    max_retries = int(os.getenv("SOM_CHAT_RETRIES", "2"))
+    
     # Create and run SoM workflow manager
-    workflow_manager = SoMWorkflowManager(config_list)
+    workflow_manager = SoMWorkflowManager(config_list, response_cache=response_cache,
+                                          approval_broker=approval_broker, metrics=metrics,
+                                          audit_log=audit_log, compaction=compaction,
+                                          termination=termination, task_index=task_index,
+                                          checkpoints=checkpoints, max_retries=max_retries)
+    concurrent = os.getenv("SOM_CONCURRENT_TEAMS", "false").lower() in ("1", "true", "yes")
     
     try:
-        report = workflow_manager.demonstrate_complete_workflow()
+        if args.batch:
+            return workflow_manager.run_batch(args.batch, args.output, workers=args.workers,
+                                              resume=not args.no_resume, backend=args.backend)
+            
+        report = workflow_manager.demonstrate_complete_workflow(concurrent=concurrent)
         return report
     except KeyboardInterrupt:
         print("\n🛑 Demonstration interrupted by user")
     except Exception as e:
         print(f"\n❌ Error during demonstration: {str(e)}")
+    finally:
+        audit_log.close()
+        if metrics is not None:
+            os.makedirs(metrics_dir, exist_ok=True)
+            with open(os.path.join(metrics_dir, "metrics.prom"), "w", encoding="utf-8") as f:
+                f.write(metrics.to_prometheus())
+            metrics.write_trace(os.path.join(metrics_dir, "trace.json"))
+            metrics.write_collapsed(os.path.join(metrics_dir, "stacks.folded"))
+            print(f"📈 Instrumentation written to {metrics_dir}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,210 @@
+"""
+Persistent LLM response cache and round checkpoints for SoM team chats.
+"""
+
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+
+class ResponseCacheMiss(KeyError):
+    """Raised in replay mode when a prompt has no recorded response"""
+
+
+class ResponseCache:
+    """
+    LLM response cache keyed on model, system message and conversation history
+    An in-memory LRU in front of an optional SQLite store; replay mode raises ResponseCacheMiss on a miss
+    """
+    
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = 1024,
+                 replay: bool = False):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        
+        if path:
+            # Pool workers share the file: WAL and a long busy timeout keep their writes from failing
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, reply TEXT, created REAL)"
+            )
+            self._db.commit()
+            
+    @staticmethod
+    def make_key(model: str, system_message: str, messages: List[Dict]) -> str:
+        """Hash the parts of a request that determine the reply"""
+        payload = json.dumps(
+            {"model": model, "system": system_message, "messages": messages},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        
+    def get(self, key: str):
+        """Return the cached reply for key, or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+                
+            reply = None
+            if self._db is not None:
+                row = self._db.execute("SELECT reply FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    reply = json.loads(row[0])
+                    self._remember(key, reply)
+                    
+            if reply is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return reply
+            
+    def set(self, key: str, model: str, reply):
+        """Store a reply in memory and, if configured, on disk"""
+        with self._lock:
+            self._remember(key, reply)
+            self.stores += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, reply, created) VALUES (?, ?, ?, ?)",
+                    (key, model, json.dumps(reply, default=str), time.time())
+                )
+                self._db.commit()
+                
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory)
+            }
+            
+    def close(self):
+        """Close the on-disk store"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+                
+    def _remember(self, key: str, reply):
+        self._memory[key] = reply
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+
+class CheckpointStore:
+    """
+    Latest round of every unfinished team chat, in a compact local SQLite file
+    A chat that raised, or whose process died, resumes from that round
+    """
+    
+    def __init__(self, path: str = "som_checkpoints.db"):
+        self.path = path
+        self.saves = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "key TEXT PRIMARY KEY, team TEXT, round INTEGER, speaker TEXT, pending_gate TEXT, "
+            "messages BLOB, status TEXT, attempts INTEGER DEFAULT 0, error TEXT, updated REAL)"
+        )
+        self._db.commit()
+        
+    @staticmethod
+    def make_key(team: str, opening_message: str) -> str:
+        return hashlib.sha256(f"{team}\n{opening_message}".encode("utf-8")).hexdigest()[:24]
+        
+    def save(self, key: str, team: str, messages: List[Dict], speaker: str, pending_gate: Optional[str] = None):
+        """Record the chat as of this round boundary"""
+        blob = zlib.compress(json.dumps(messages, default=str).encode("utf-8"))
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO checkpoints (key, team, round, speaker, pending_gate, messages, status, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'running', ?) ON CONFLICT(key) DO UPDATE SET round=excluded.round, "
+                "speaker=excluded.speaker, pending_gate=excluded.pending_gate, messages=excluded.messages, "
+                "attempts=CASE WHEN status='completed' THEN 0 ELSE attempts END, status='running', "
+                "updated=excluded.updated",
+                (key, team, len(messages), speaker, pending_gate, blob, time.time())
+            )
+            self._db.commit()
+            self.saves += 1
+            
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """The stored checkpoint for key, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT team, round, speaker, pending_gate, messages, status, attempts, error FROM checkpoints "
+                "WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        team, round, speaker, pending_gate, blob, status, attempts, error = row
+        return {"key": key, "team": team, "round": round, "speaker": speaker, "pending_gate": pending_gate,
+                "messages": json.loads(zlib.decompress(blob)) if blob else [], "status": status,
+                "attempts": attempts, "error": error}
+                
+    def resume_point(self, key: str, max_attempts: int) -> Optional[Dict[str, Any]]:
+        """Checkpoint of an unfinished chat to resume, unless it already failed max_attempts times"""
+        checkpoint = self.load(key)
+        if checkpoint is None or checkpoint["status"] == "completed" or not checkpoint["messages"]:
+            return None
+        if checkpoint["attempts"] >= max_attempts:
+            print(f"⚠️ Discarding checkpoint of {checkpoint['team']}: failed {checkpoint['attempts']} times "
+                  f"(last error: {checkpoint['error']})")
+            self.discard(key)
+            return None
+        return checkpoint
+        
+    def fail(self, key: str, error: str):
+        """Count a failed attempt of the chat"""
+        with self._lock:
+            self._db.execute("UPDATE checkpoints SET status='failed', attempts=attempts+1, error=?, updated=? "
+                             "WHERE key = ?", (error[:500], time.time(), key))
+            self._db.commit()
+            
+    def complete(self, key: str):
+        """Mark the chat finished and drop its messages"""
+        with self._lock:
+            self._db.execute("UPDATE checkpoints SET status='completed', messages=NULL, pending_gate=NULL, "
+                             "updated=? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            
+    def discard(self, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+            self._db.commit()
+            
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Running or failed chats, most recently updated first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, team, round, speaker, pending_gate, status, attempts, error FROM checkpoints "
+                "WHERE status != 'completed' ORDER BY updated DESC"
+            ).fetchall()
+        fields = ("key", "team", "round", "speaker", "pending_gate", "status", "attempts", "error")
+        return [dict(zip(fields, row)) for row in rows]
+        
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,366 @@
+"""
+Process pool backend that runs SoM task specs in worker processes with warm teams.
+"""
+
+import io
+import os
+import re
+import sys
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+import som_architecture
+from som_architecture import (AuditLog, CompactionPolicy, SoMWorkflowManager, TaskIndex, TerminationPolicy,
+                              WorkflowMetrics, autogen, create_config_list)
+from som_cache import ResponseCache, CheckpointStore
+from som_approvals import ApprovalBroker
+
+
+class _TaskOutput:
+    """sys.stdout stand-in for pool workers that keeps each task thread's output apart"""
+    
+    def __init__(self):
+        self._local = threading.local()
+        
+    def begin(self):
+        self._local.buffer = io.StringIO()
+        
+    def end(self) -> str:
+        buffer, self._local.buffer = getattr(self._local, "buffer", None), None
+        return buffer.getvalue() if buffer is not None else ""
+        
+    def write(self, text: str) -> int:
+        # Output of other threads, or of every thread when logs are not collected, is dropped
+        buffer = getattr(self._local, "buffer", None)
+        return buffer.write(text) if buffer is not None else len(text)
+        
+    def flush(self):
+        pass
+
+
+def _process_worker(conn, settings: Dict[str, Any]):
+    """Main loop of a WorkflowProcessPool worker: run (key, task_id, spec) messages until None"""
+    som_architecture.team_specs = settings["specs"]
+    output = _TaskOutput()
+    sys.stdout = output
+    
+    # Without a picklable config_list (e.g. a ProviderPool's shared http_client) rebuild it from the environment
+    config_list = settings["config_list"] or create_config_list()
+    approval_broker = ApprovalBroker(**settings["approval"]["options"])
+    for pattern, decision, team in settings["approval"]["rules"]:
+        approval_broker.add_rule(pattern, decision, team)
+    response_cache = None
+    if settings["response_cache"] is not None:
+        response_cache = ResponseCache(**settings["response_cache"])
+    # Each worker indexes its own results, starting from the parent's entries
+    task_index = settings["task_index"]
+    # Workers share the checkpoint file; SQLite serialises their writes
+    checkpoints = None
+    if settings["checkpoints"] is not None:
+        checkpoints = CheckpointStore(settings["checkpoints"])
+    send_lock = threading.Lock()
+    
+    def run(key: int, task_id: str, spec: Dict[str, Any]):
+        metrics = WorkflowMetrics() if settings["metrics"] else None
+        audit_log = AuditLog()
+        manager = SoMWorkflowManager(config_list, response_cache=response_cache,
+                                     approval_broker=approval_broker, metrics=metrics,
+                                     audit_log=audit_log, compaction=settings["compaction"],
+                                     termination=settings["termination"], task_index=task_index,
+                                     checkpoints=checkpoints, max_retries=settings["max_retries"])
+        if settings["capture_output"]:
+            output.begin()
+        try:
+            record = manager.run_task(task_id, spec)
+        finally:
+            log = output.end()
+        record["worker"] = os.getpid()
+        message = ("result", key, record, log, audit_log.recent(),
+                   metrics.snapshot() if metrics is not None else None)
+        with send_lock:
+            try:
+                conn.send(message)
+            except Exception as e:
+                failed = {"task_id": task_id, "status": "failed", "worker": os.getpid(),
+                          "error": f"Result could not be sent to the pool: {str(e)}"}
+                conn.send(("result", key, failed, log, [], None))
+                
+    # Import AutoGen before the first task arrives
+    autogen.ConversableAgent
+    with ThreadPoolExecutor(max_workers=settings["threads"], thread_name_prefix="som-worker") as pool:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            pool.submit(run, *message)
+    conn.close()
+
+
+class _PoolWorker:
+    """Parent-side handle of one worker process"""
+    
+    __slots__ = ("process", "conn", "in_flight", "completed", "retiring", "replaced")
+    
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.in_flight = {}
+        self.completed = 0
+        self.retiring = False
+        self.replaced = False
+
+
+class WorkflowProcessPool:
+    """
+    Runs SoM task specs in worker processes with warm teams, sidestepping the GIL
+    Worker gates are decided by the broker's regex rules and timeout only; predicate rules are refused
+    """
+    
+    def __init__(self, config_list: List[Dict], processes: Optional[int] = None,
+                 threads_per_worker: int = 1,
+                 response_cache: Optional[ResponseCache] = None,
+                 approval_broker: Optional[ApprovalBroker] = None,
+                 metrics: Optional[WorkflowMetrics] = None,
+                 audit_log: Optional[AuditLog] = None,
+                 compaction: Optional[Dict[str, CompactionPolicy]] = None,
+                 termination: Optional[TerminationPolicy] = None,
+                 task_index: Optional[TaskIndex] = None,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 max_retries: int = 2,
+                 max_tasks_per_worker: Optional[int] = None,
+                 log_dir: Optional[str] = None,
+                 start_method: str = "spawn",
+                 gate_timeout: float = 300.0):
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.metrics = metrics
+        self.audit_log = audit_log
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.log_dir = log_dir
+        self.start_method = start_method
+        picklable = not any("http_client" in entry for entry in config_list)
+        approval = {"options": {"default_timeout": gate_timeout}, "rules": []}
+        if approval_broker is not None:
+            if len(approval_broker.rules) != len(approval_broker.rule_patterns):
+                raise ValueError("Predicate approval rules cannot be sent to worker processes; "
+                                 "use regex rules with the process backend")
+            approval = {"options": {"default_timeout": approval_broker.default_timeout or gate_timeout,
+                                    "timeout_decision": approval_broker.timeout_decision},
+                        "rules": list(approval_broker.rule_patterns)}
+        self._settings = {
+            "config_list": config_list if picklable else None,
+            "specs": som_architecture.team_specs,
+            "approval": approval,
+            "response_cache": ({"path": response_cache.path, "replay": response_cache.replay}
+                               if response_cache is not None else None),
+            "metrics": metrics is not None,
+            "compaction": compaction,
+            "termination": termination,
+            "task_index": task_index,
+            "checkpoints": checkpoints.path if checkpoints is not None else None,
+            "max_retries": max_retries,
+            "capture_output": log_dir is not None,
+            "threads": self.threads_per_worker
+        }
+        self.counts = {"submitted": 0, "completed": 0, "failed": 0, "lost": 0, "workers_started": 0}
+        self._context = None
+        self._workers = []
+        self._backlog = deque()
+        self._futures = {}
+        self._next_key = 0
+        self._accepting = True
+        self._closed = False
+        self._collector = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        
+    def start(self) -> "WorkflowProcessPool":
+        """Start the worker processes (also done on the first submit)"""
+        with self._lock:
+            if self._context is None:
+                self._context = multiprocessing.get_context(self.start_method)
+                if self.log_dir:
+                    os.makedirs(self.log_dir, exist_ok=True)
+                for _ in range(self.processes):
+                    self._spawn()
+                self._collector = threading.Thread(target=self._collect, name="som-pool-collector", daemon=True)
+                self._collector.start()
+        return self
+        
+    def submit(self, task_id: str, spec: Dict[str, Any]) -> Future:
+        """Queue a task spec; the future resolves to its result record"""
+        self.start()
+        future = Future()
+        with self._lock:
+            if not self._accepting:
+                raise RuntimeError("WorkflowProcessPool is draining and accepts no new tasks")
+            key = self._next_key
+            self._next_key += 1
+            self._futures[key] = future
+            self._backlog.append((key, task_id, spec))
+            self.counts["submitted"] += 1
+            self._dispatch()
+        return future
+        
+    def restart(self):
+        """Rolling restart: each worker is replaced once its in-flight tasks are done"""
+        with self._lock:
+            for worker in list(self._workers):
+                if not worker.retiring:
+                    self._retire(worker)
+            self._dispatch()
+            
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting tasks and wait for the queued and running ones; False on timeout"""
+        with self._lock:
+            self._accepting = False
+            return self._idle.wait_for(lambda: not self._futures, timeout)
+            
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """Stop the workers, after draining when wait is set; queued tasks are cancelled otherwise"""
+        if wait:
+            self.drain(timeout)
+        with self._lock:
+            self._accepting = False
+            self._closed = True
+            while self._backlog:
+                key, _, _ = self._backlog.popleft()
+                self._futures.pop(key).cancel()
+            workers = list(self._workers)
+            for worker in workers:
+                self._stop(worker)
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if self._collector is not None:
+            self._collector.join(timeout)
+            
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counts, workers=len(self._workers), queued=len(self._backlog),
+                        in_flight=sum(len(worker.in_flight) for worker in self._workers))
+                        
+    def __enter__(self) -> "WorkflowProcessPool":
+        return self.start()
+        
+    def __exit__(self, *exc_info):
+        self.shutdown(wait=exc_info[0] is None)
+        
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_process_worker, args=(child_conn, self._settings),
+                                        name=f"som-worker-{self.counts['workers_started']}", daemon=True)
+        process.start()
+        child_conn.close()
+        self._workers.append(_PoolWorker(process, parent_conn))
+        self.counts["workers_started"] += 1
+        
+    def _retire(self, worker: _PoolWorker):
+        """Take a worker out of rotation, starting its replacement at once"""
+        worker.retiring = True
+        if not self._closed:
+            self._spawn()
+            worker.replaced = True
+        if not worker.in_flight:
+            self._stop(worker)
+            
+    def _stop(self, worker: _PoolWorker):
+        try:
+            worker.conn.send(None)
+        except (OSError, ValueError):
+            pass  # Already gone
+            
+    def _dispatch(self):
+        """Hand queued tasks to the least busy workers with a free thread"""
+        while self._backlog:
+            available = [worker for worker in self._workers
+                         if not worker.retiring and len(worker.in_flight) < self.threads_per_worker]
+            if not available:
+                return
+            worker = min(available, key=lambda w: len(w.in_flight))
+            key, task_id, spec = self._backlog.popleft()
+            worker.in_flight[key] = task_id
+            try:
+                worker.conn.send((key, task_id, spec))
+            except (OSError, ValueError):
+                worker.retiring = True  # Dead; the collector fails its tasks and replaces it
+            
+    def _collect(self):
+        """Collector thread: receive results and replace workers that exit"""
+        from multiprocessing.connection import wait as wait_ready
+        
+        while True:
+            with self._lock:
+                if self._closed and not self._workers:
+                    return
+                handles = {}
+                for worker in self._workers:
+                    handles[worker.conn] = worker
+                    handles[worker.process.sentinel] = worker
+            for handle in wait_ready(list(handles), timeout=0.2):
+                worker = handles[handle]
+                if worker not in self._workers:
+                    continue
+                try:
+                    # Read any results still in the pipe before handling an exit
+                    while worker.conn.poll():
+                        self._finish(worker, *worker.conn.recv()[1:])
+                except (EOFError, OSError):
+                    pass
+                if handle is worker.process.sentinel or worker.conn.closed:
+                    self._lost(worker)
+                    
+    def _finish(self, worker: _PoolWorker, key: int, record: Dict[str, Any], log: str,
+                audit_entries: List[Dict[str, Any]], snapshot: Optional[Dict[str, Any]]):
+        if self.metrics is not None and snapshot is not None:
+            self.metrics.merge(snapshot)
+        if self.audit_log is not None:
+            for entry in audit_entries:
+                self.audit_log.append(entry)
+        if self.log_dir and log:
+            safe_id = re.sub(r"[^\w.-]", "_", str(record.get("task_id", key)))
+            with open(os.path.join(self.log_dir, f"{safe_id}.log"), "a", encoding="utf-8") as f:
+                f.write(log)
+                
+        with self._lock:
+            worker.in_flight.pop(key, None)
+            worker.completed += 1
+            future = self._futures.pop(key)
+            self.counts["completed" if record.get("status") == "completed" else "failed"] += 1
+            if (self.max_tasks_per_worker and worker.completed >= self.max_tasks_per_worker
+                    and not worker.retiring):
+                self._retire(worker)
+            elif worker.retiring and not worker.in_flight:
+                self._stop(worker)
+            self._dispatch()
+            self._idle.notify_all()
+        future.set_result(record)
+        
+    def _lost(self, worker: _PoolWorker):
+        """A worker process exited: fail its in-flight tasks and replace it unless it was retired"""
+        worker.process.join()
+        with self._lock:
+            self._workers.remove(worker)
+            failed = [(self._futures.pop(key), task_id) for key, task_id in worker.in_flight.items()]
+            worker.in_flight.clear()
+            if worker.process.exitcode != 0:
+                print(f"⚠️ Worker {worker.process.name} exited with code {worker.process.exitcode}")
+            if not worker.replaced and not self._closed:
+                self._spawn()
+            self.counts["lost"] += len(failed)
+            self.counts["failed"] += len(failed)
+            self._dispatch()
+            self._idle.notify_all()
+        worker.conn.close()
+        for future, task_id in failed:
+            future.set_result({"task_id": task_id, "status": "failed",
+                               "error": f"Worker {worker.process.name} exited with code {worker.process.exitcode}",
+                               "finished_at": datetime.now().isoformat()})
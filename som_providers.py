@@ -0,0 +1,234 @@
+"""
+Load-balanced pool of OpenAI-compatible endpoints behind one shared HTTP client.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from typing import Dict, List, Any, Optional
+
+
+class ProviderEndpoint:
+    """One OpenAI-compatible route: base URL, API key, optional model override and routing weight"""
+    
+    def __init__(self, base_url: str, api_key: str, model: Optional[str] = None, weight: float = 1.0,
+                 rate_limit: Optional[float] = None, burst: Optional[int] = None, name: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.weight = weight
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.name = name or self.base_url
+        self.latency = None
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any]) -> "ProviderEndpoint":
+        """Build from a JSON spec; "api_key_env" names an environment variable holding the key"""
+        spec = dict(spec)
+        if "api_key_env" in spec:
+            spec["api_key"] = os.getenv(spec.pop("api_key_env"), "")
+        return cls(**spec)
+
+
+class TokenBucket:
+    """Blocking token bucket: rate tokens per second, up to capacity banked"""
+    
+    def __init__(self, rate: float, capacity: Optional[int] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+class ProviderPool:
+    """
+    Load-balanced pool of OpenAI-compatible endpoints behind one persistent HTTP client
+    Failing endpoints cool down and their requests are retried on the next healthy one
+    """
+    
+    BASE_URL = "http://som-provider-pool/v1"
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    ROUTING = ("least_latency", "weighted")
+    
+    def __init__(self, endpoints: List[ProviderEndpoint], routing: str = "least_latency",
+                 max_retries: int = 4, backoff: float = 0.5, max_backoff: float = 30.0,
+                 price: Optional[List[float]] = None):
+        if not endpoints:
+            raise ValueError("ProviderPool needs at least one endpoint")
+        if routing not in self.ROUTING:
+            raise ValueError(f"Unknown routing '{routing}', expected one of {self.ROUTING}")
+        self.endpoints = endpoints
+        self.routing = routing
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.price = price
+        self.retries = 0
+        self._buckets = {}
+        for endpoint in endpoints:
+            if endpoint.rate_limit and endpoint.api_key not in self._buckets:
+                self._buckets[endpoint.api_key] = TokenBucket(endpoint.rate_limit, endpoint.burst)
+        self._lock = threading.Lock()
+        self._http_client = None
+        
+    @classmethod
+    def from_spec(cls, spec: Any) -> "ProviderPool":
+        """Build from a list of endpoint specs or {"endpoints": [...], "routing": ..., ...}"""
+        if isinstance(spec, list):
+            spec = {"endpoints": spec}
+        options = {key: value for key, value in spec.items() if key != "endpoints"}
+        return cls([ProviderEndpoint.from_spec(entry) for entry in spec["endpoints"]], **options)
+        
+    @property
+    def http_client(self):
+        """Shared client (openai.DefaultHttpxClient subclass) that routes every request through the pool"""
+        if self._http_client is None:
+            import openai
+            
+            pool = self
+            
+            class PooledHttpClient(openai.DefaultHttpxClient):
+                def send(self, request, **kwargs):
+                    return pool.send(self, request, lambda routed: super(PooledHttpClient, self).send(routed, **kwargs))
+                    
+                def __deepcopy__(self, memo):
+                    # AutoGen deep-copies llm_config per agent; keep sharing one connection pool
+                    return self
+                    
+            self._http_client = PooledHttpClient()
+        return self._http_client
+        
+    def config_list(self, model: Optional[str] = None) -> List[Dict]:
+        """Config list for AutoGen agents; the placeholder base URL and key are rewritten per request"""
+        config = {
+            "model": model or self.endpoints[0].model or os.getenv("OPENAI_MODEL", "gpt-4"),
+            "api_key": "som-provider-pool",
+            "base_url": self.BASE_URL,
+            "http_client": self.http_client,
+            "max_retries": 0
+        }
+        if self.price is not None:
+            config["price"] = self.price
+        return [config]
+        
+    def send(self, client, request, send):
+        """Route one request, retrying on throttling, server errors and connection failures"""
+        attempt = 0
+        while True:
+            endpoint = self._choose()
+            bucket = self._buckets.get(endpoint.api_key)
+            if bucket is not None:
+                bucket.acquire()
+            routed = self._route(client, request, endpoint)
+            
+            started = time.monotonic()
+            try:
+                response = send(routed)
+            except Exception:
+                self._finish(endpoint, started, failed=True)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                continue
+                
+            failed = response.status_code in self.RETRY_STATUSES
+            self._finish(endpoint, started, failed=failed, retry_after=response.headers.get("retry-after"))
+            if not failed or attempt >= self.max_retries:
+                return response
+            response.close()
+            attempt += 1
+            
+    def _choose(self) -> ProviderEndpoint:
+        """Pick an endpoint that is not cooling down, waiting for the earliest one if all are"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                ready = [endpoint for endpoint in self.endpoints if endpoint.cooldown_until <= now]
+                if ready:
+                    if self.routing == "weighted":
+                        weights = [e.weight / (1 + e.consecutive_failures) for e in ready]
+                        endpoint = random.choices(ready, weights=weights)[0]
+                    else:
+                        # Failing endpoints rank last; an unmeasured one is estimated at twice the
+                        # slowest measured latency, so it is tried once the healthy ones are busy
+                        measured = [e.latency for e in ready if e.latency is not None]
+                        unmeasured = 2 * max(measured) if measured else 0.0
+                        endpoint = min(ready, key=lambda e: (
+                            e.consecutive_failures,
+                            (unmeasured if e.latency is None else e.latency) * (e.in_flight + 1) / e.weight
+                        ))
+                    endpoint.in_flight += 1
+                    endpoint.requests += 1
+                    return endpoint
+                wait_for = min(endpoint.cooldown_until for endpoint in self.endpoints) - now
+            time.sleep(max(wait_for, 0.001))
+            
+    def _finish(self, endpoint: ProviderEndpoint, started: float, failed: bool,
+                retry_after: Optional[str] = None):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            endpoint.in_flight -= 1
+            if failed:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                self.retries += 1
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    backoff = self.backoff * 2 ** (endpoint.consecutive_failures - 1)
+                    delay = min(self.max_backoff, backoff) * random.uniform(0.5, 1.5)
+                endpoint.cooldown_until = time.monotonic() + delay
+            else:
+                endpoint.consecutive_failures = 0
+                endpoint.latency = elapsed if endpoint.latency is None else 0.8 * endpoint.latency + 0.2 * elapsed
+                
+    def _route(self, client, request, endpoint: ProviderEndpoint):
+        """Copy of request aimed at endpoint, with its key and model"""
+        url = str(request.url)
+        if url.startswith(self.BASE_URL):
+            url = endpoint.base_url + url[len(self.BASE_URL):]
+        content = request.content
+        if endpoint.model and content:
+            body = json.loads(content)
+            body["model"] = endpoint.model
+            content = json.dumps(body).encode("utf-8")
+        headers = {name: value for name, value in request.headers.items()
+                   if name.lower() not in ("host", "content-length", "authorization")}
+        headers["Authorization"] = f"Bearer {endpoint.api_key}"
+        return client.build_request(request.method, url, headers=headers, content=content,
+                                    extensions=request.extensions)
+        
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "endpoints": {
+                    endpoint.name: {
+                        "requests": endpoint.requests,
+                        "failures": endpoint.failures,
+                        "consecutive_failures": endpoint.consecutive_failures,
+                        "latency_ms": round(endpoint.latency * 1000, 2) if endpoint.latency else None
+                    } for endpoint in self.endpoints
+                }
+            }
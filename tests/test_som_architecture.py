@@ -0,0 +1,690 @@
+"""
+Offline tests for som_architecture against the local FakeLLMServer.
+
+Every test runs in its own working directory, so databases and result files never leak between
+tests; the fake server's config list already keeps AutoGen's ./.cache disk cache off.
+"""
+
+import os
+import json
+import time
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import som_architecture as som
+from som_pool import WorkflowProcessPool
+from som_providers import ProviderEndpoint, ProviderPool
+from benchmarks.fake_llm import FakeLLMServer
+
+pytestmark = pytest.mark.skipif(not som.AUTOGEN_AVAILABLE, reason="pyautogen is not installed")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def server(workdir):
+    fake = FakeLLMServer(completion_tokens=8).start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def broker():
+    approvals = som.ApprovalBroker(default_timeout=5.0)
+    approvals.add_rule(r".*", "MODIFY continue with the plan")
+    return approvals
+
+
+def inner_team(config_list, broker, **options):
+    """Research team on a private registry, running every round"""
+    options.setdefault("termination", som.TerminationPolicy.disabled())
+    return som.InnerTeamManager("Research_Team", config_list, registry=som.TeamRegistry(),
+                                approval_broker=broker, max_round=4, **options)
+
+
+def test_response_cache_records_then_replays(server, broker, workdir):
+    cache = som.ResponseCache(str(workdir / "responses.db"))
+    recorded = inner_team(server.config_list(), broker, response_cache=cache).execute_workflow("Size the widget market")
+    assert cache.stats()["stores"] > 0
+    requests = server.requests
+
+    # A fresh process in replay mode answers from the SQLite store without calling the provider
+    replay = som.ResponseCache(str(workdir / "responses.db"), replay=True)
+    replayed = inner_team(server.config_list(), broker, response_cache=replay).execute_workflow("Size the widget market")
+    assert server.requests == requests
+    assert replay.stats()["hits"] == cache.stats()["stores"]
+    assert replayed.final_output == recorded.final_output
+
+
+def test_response_cache_survives_restart_and_bounds_memory(workdir):
+    cache = som.ResponseCache(str(workdir / "responses.db"), max_memory_entries=2)
+    keys = [cache.make_key("fake-gpt", "system", [{"role": "user", "content": str(i)}]) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.set(key, "fake-gpt", f"reply {i}")
+    assert cache.stats()["memory_entries"] == 2
+    cache.close()
+
+    reopened = som.ResponseCache(str(workdir / "responses.db"))
+    assert [reopened.get(key) for key in keys] == ["reply 0", "reply 1", "reply 2"]
+    assert reopened.get(reopened.make_key("fake-gpt", "system", [])) is None
+    assert reopened.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_cache_and_metrics_cover_sync_and_async_chats(server, broker, workdir, mode):
+    cache = som.ResponseCache()
+    metrics = som.WorkflowMetrics()
+    manager = inner_team(server.config_list(), broker, response_cache=cache, metrics=metrics)
+    if mode == "sync":
+        digest = manager.execute_workflow("Compare widget suppliers")
+    else:
+        digest = som.asyncio.run(manager.a_execute_workflow("Compare widget suppliers"))
+
+    assert digest.rounds > 1
+    assert cache.stats()["misses"] == cache.stats()["stores"] == server.requests > 0
+    agents = {name: entry for name, entry in metrics.summary().items() if entry.get("llm_call_calls")}
+    assert sum(entry["llm_call_calls"] for entry in agents.values()) == server.requests
+    assert all(entry.get("som_completion_tokens_total", 0) > 0 for entry in agents.values())
+
+
+def test_task_index_skips_failed_chats(workdir, broker):
+    failing = FakeLLMServer(completion_tokens=8, error_every=1).start()
+    try:
+        config_list = [dict(failing.config_list()[0], max_retries=0)]
+        index = som.TaskIndex(threshold=0.9)
+        manager = inner_team(config_list, broker, task_index=index, max_retries=1)
+        digest = manager.execute_workflow("Estimate widget demand")
+        assert digest.stop_reason == "error" and not digest.final_output
+        assert len(index) == 0
+
+        requests = failing.requests
+        again = manager.execute_workflow("Estimate widget demand")
+        assert again.stop_reason == "error"
+        assert failing.requests > requests
+    finally:
+        failing.stop()
+
+
+def test_batch_records_malformed_lines_and_continues(server, broker, workdir):
+    spec = {"teams": {"Research_Team": "Rank widget vendors"}, "coordination_task": "Pick one", "max_round": 3}
+    lines = [dict(spec, task_id="first"), '{"task_id": "torn", "teams": {', '["not", "a", "spec"]',
+             dict(spec, task_id="last")]
+    (workdir / "tasks.jsonl").write_text("\n".join(l if isinstance(l, str) else json.dumps(l) for l in lines) + "\n")
+    manager = som.SoMWorkflowManager(server.config_list(), approval_broker=broker,
+                                     termination=som.TerminationPolicy.disabled())
+
+    counts = manager.run_batch("tasks.jsonl", "results.jsonl", workers=2)
+    records = {r["task_id"]: r for r in map(json.loads, (workdir / "results.jsonl").read_text().splitlines())}
+    assert counts["completed"] == 2 and counts["failed"] == 2
+    assert records["first"]["status"] == records["last"]["status"] == "completed"
+    assert records["2"]["status"] == records["3"]["status"] == "failed"
+    assert "line 2" in records["2"]["error"]
+
+    resumed = manager.run_batch("tasks.jsonl", "results.jsonl", workers=2)
+    assert resumed["skipped"] == 4 and resumed["submitted"] == resumed["failed"] == 0
+    assert len((workdir / "results.jsonl").read_text().splitlines()) == 4
+
+
+def test_async_early_stop_and_cancellation_end_the_chat_cleanly(server, workdir):
+    approvals = som.ApprovalBroker(default_timeout=5.0)
+    approvals.add_rule(r".*", "APPROVE")
+    som_architecture = som.SoMArchitecture(server.config_list(), approval_broker=approvals)
+    manager = som.InnerTeamManager("Research_Team", server.config_list(), registry=som.TeamRegistry(),
+                                   approval_broker=approvals, max_round=8)
+    som_architecture.register_inner_team("Research_Team", manager)
+
+    digest = som.asyncio.run(manager.a_execute_workflow("Approve the widget plan"))
+    assert digest.decision == "APPROVE" and digest.stop_reason == "approve"
+    assert [entry["action"] for entry in som_architecture.workflow_log.recent()] == ["workflow_start"]
+
+    cancel_event = som.threading.Event()
+    events = []
+
+    def cancel_after_first_reply(event):
+        events.append(event)
+        if event.kind == "message" and event.round >= 1:
+            cancel_event.set()
+
+    cancelled = som.asyncio.run(manager.a_execute_workflow("Draft the widget roadmap", cancel_event,
+                                                           on_event=cancel_after_first_reply))
+    assert cancelled.stop_reason != "error"
+    assert cancelled.rounds == 1
+    assert events[-1].kind == "workflow_end"
+
+
+def test_consensus_hands_the_turn_to_the_human_gate(workdir):
+    scripted = FakeLLMServer(completion_tokens=8, reply_scripts={
+        "Research Analyst": ["LGTM, I agree with the widget plan."],
+        "Data Validator": ["I agree, the data supports it."]
+    }).start()
+    approvals = som.ApprovalBroker(default_timeout=5.0)
+    approvals.add_rule(r".*", "APPROVE")
+    try:
+        manager = som.InnerTeamManager("Research_Team", scripted.config_list(), registry=som.TeamRegistry(),
+                                       approval_broker=approvals, max_round=8)
+        events = []
+        digest = manager.execute_workflow("Validate the widget plan", on_event=events.append)
+    finally:
+        scripted.stop()
+    speakers = [event.agent for event in events if event.kind == "message"]
+    # Strategy_Advisor is skipped, but the gate still has the final word
+    assert speakers == ["Research_Team_Human", "Research_Analyst", "Data_Validator", "Research_Team_Human"]
+    assert digest.stop_reason == "approve" and digest.decision == "APPROVE"
+
+
+def test_provider_pool_routes_around_a_failing_endpoint(workdir):
+    import openai
+
+    dead = FakeLLMServer(error_every=1).start()
+    healthy = FakeLLMServer(completion_tokens=4).start()
+    try:
+        # A tiny backoff lets the dead endpoint's cooldown lapse between requests
+        pool = ProviderPool([ProviderEndpoint(dead.base_url, "sk-fake", name="dead"),
+                             ProviderEndpoint(healthy.base_url, "sk-fake", name="healthy")],
+                            backoff=0.001)
+        client = openai.OpenAI(api_key="som-provider-pool", base_url=pool.BASE_URL,
+                               http_client=pool.http_client, max_retries=0)
+        for i in range(5):
+            client.chat.completions.create(model="fake-gpt", messages=[{"role": "user", "content": str(i)}])
+            time.sleep(0.01)
+    finally:
+        dead.stop()
+        healthy.stop()
+    stats = pool.stats()["endpoints"]
+    assert stats["dead"]["requests"] == 1 and stats["dead"]["consecutive_failures"] == 1
+    assert stats["healthy"]["requests"] == 5 and stats["healthy"]["consecutive_failures"] == 0
+
+
+def test_process_pool_refuses_predicates_and_times_out_unmatched_gates(server, workdir):
+    predicates = som.ApprovalBroker()
+    predicates.add_rule(lambda request: True, "APPROVE")
+    with pytest.raises(ValueError):
+        WorkflowProcessPool(server.config_list(), 1, approval_broker=predicates)
+
+    # No rule matches and the broker has no timeout: the worker must not wait forever
+    manager = som.SoMWorkflowManager(server.config_list(), approval_broker=som.ApprovalBroker())
+    spec = {"teams": {"Research_Team": "Audit widget suppliers"}, "coordination_task": "Summarise",
+            "max_round": 6}
+    with manager.process_pool(1, gate_timeout=0.2) as pool:
+        record = pool.submit("gated", spec).result(timeout=120)
+    assert record["status"] == "completed"
+    assert record["inner_teams"]["Research_Team"]["result"].decision == "REJECT"
+
+
+def test_response_cache_file_is_shared_in_wal_mode(workdir):
+    caches = [som.ResponseCache(str(workdir / "shared.db")) for _ in range(2)]
+    assert caches[0]._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    key = caches[0].make_key("fake-gpt", "system", [])
+    caches[0].set(key, "fake-gpt", "from the first worker")
+    assert caches[1].get(key) == "from the first worker"
+
+
+def test_reused_task_still_streams_its_digest(server, broker, workdir):
+    index = som.TaskIndex(threshold=0.9)
+    manager = inner_team(server.config_list(), broker, task_index=index)
+    first = manager.execute_workflow("Forecast widget sales for 2027")
+    assert len(index) == 1
+
+    async def collect():
+        return [event async for event in manager.stream_workflow("Forecast widget sales for 2027")]
+
+    requests = server.requests
+    events = som.asyncio.run(collect())
+    assert server.requests == requests
+    assert [event.kind for event in events] == ["workflow_start", "workflow_end"]
+    assert events[-1].data["digest"].stop_reason == "reused"
+    assert events[-1].data["digest"].final_output == first.final_output
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_cancel_stops_running_inner_teams(workdir, broker, mode):
+    slow = FakeLLMServer(latency=0.2, completion_tokens=4).start()
+    try:
+        society = som.SoMArchitecture(slow.config_list(), approval_broker=broker,
+                                      termination=som.TerminationPolicy.disabled())
+        for team_name in ("Research_Team", "Development_Team"):
+            society.register_inner_team(team_name, society.create_inner_team(team_name))
+        tasks = {"Research_Team": "Map widget demand", "Development_Team": "Plan the widget build"}
+        som.threading.Timer(0.5, society.cancel).start()
+
+        if mode == "sync":
+            results = society.execute_inner_teams(tasks)
+        else:
+            results = som.asyncio.run(society.a_execute_inner_teams(tasks))
+    finally:
+        slow.stop()
+    assert {result["status"] for result in results.values()} == {"cancelled"}
+    # Uncancelled, the two chats make 12 calls of 0.2 s each; each may finish the call in flight
+    assert slow.requests <= 6
+
+
+class FailingCoordinator:
+    """Outer team stand-in that records its calls and then fails"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def execute_coordination(self, task, digests=None, cancel_event=None):
+        self.calls += 1
+        raise RuntimeError("coordination failed")
+
+    async def a_execute_coordination(self, task, digests=None, cancel_event=None):
+        return self.execute_coordination(task, digests, cancel_event)
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_society_coordination_failures_and_cancellation_match(server, broker, mode):
+    society = som.SoMArchitecture(server.config_list(), approval_broker=broker,
+                                  termination=som.TerminationPolicy.disabled())
+    society.register_inner_team("Research_Team", inner_team(server.config_list(), broker))
+    society.outer_team = FailingCoordinator()
+
+    def run():
+        if mode == "sync":
+            return society.execute_workflow("Review widget pricing")
+        return som.asyncio.run(society.a_execute_workflow("Review widget pricing"))
+
+    assert run() is None
+    assert society.outer_team.calls == 1
+
+    society.cancel()
+    assert run() is None
+    assert society.outer_team.calls == 1
+
+
+def test_concurrency_budget_is_shared_by_sync_and_async_teams():
+    budget = som.ConcurrencyBudget(1)
+
+    async def hold(seconds):
+        async with budget.async_slot():
+            await som.asyncio.sleep(seconds)
+
+    async def contend():
+        await som.asyncio.gather(hold(0.05), hold(0.05))
+
+    # The budget outlives the first event loop
+    som.asyncio.run(contend())
+    som.asyncio.run(contend())
+
+    def hold_sync():
+        with budget.slot():
+            time.sleep(0.05)
+
+    threads = [som.threading.Thread(target=hold_sync) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    som.asyncio.run(contend())
+    for thread in threads:
+        thread.join()
+    assert budget.peak == 1 and budget.in_use == 0
+
+
+def test_audit_log_append_round_trips_records_with_clashing_detail():
+    log = som.AuditLog()
+    log.record("Research_Team", "workflow_end", task="Rank vendors", status="completed", rounds=3)
+    copy = som.AuditLog()
+    for entry in log.recent():
+        copy.append(dict(entry, status="stale", source="worker-1"))
+    assert copy.recent()[0]["detail"] == {"status": "completed", "rounds": 3, "source": "worker-1"}
+    assert copy.recent()[0]["timestamp"] == log.recent()[0]["timestamp"]
+    assert copy.summary()["inner_team_workflows"] == 1
+
+
+@pytest.mark.parametrize("budget", [150, 300, 1000])
+def test_history_compaction_keeps_the_prompt_within_the_token_budget(budget):
+    agent = som.autogen.ConversableAgent("Research_Analyst", llm_config=False)
+    agent._som_runtime = {"compaction": som.CompactionPolicy(window=4, default_budget=budget)}
+    messages = [{"role": "user", "content": "Plan the widget launch " * 10}]
+    messages += [{"role": "assistant", "name": f"agent_{i}", "content": f"Finding {i}: " + "widgets " * 40}
+                 for i in range(20)]
+
+    compacted = som.HistoryCompactor(agent)(messages)
+    assert som.estimate_tokens(compacted) <= budget
+    assert compacted[0] == messages[0] and compacted[-1] == messages[-1]
+    if budget >= 1000:
+        assert compacted[1]["content"].startswith("Summary of earlier discussion:")
+
+
+def research_spec(graph, terminal_roles=()):
+    """The bundled research team with another speaker graph"""
+    agents = {role: {"kind": kind, "name": name, "system_message": message}
+              for role, (kind, name, message, _) in som.team_specs.get("research").agents.items()}
+    return som.TeamSpec("research", agents, "human_proxy", speaker_graph=graph, name_patterns=["Research"],
+                        terminal_roles=terminal_roles)
+
+
+def test_speaker_graph_rejects_dead_ends_unless_terminal():
+    graph = {"human_proxy": ["research_analyst"], "research_analyst": ["data_validator"]}
+    with pytest.raises(ValueError, match="data_validator"):
+        research_spec(graph)
+    research_spec(graph, ["data_validator", "strategy_advisor"])
+    with pytest.raises(ValueError, match="strategy_advisor"):
+        som.SpeakerGraph(graph, {role: object() for role in research_spec({}).agents}, ["data_validator"])
+
+
+def test_chat_ended_by_a_terminal_role_reports_why(server, broker):
+    specs = som.TeamSpecRegistry([])
+    specs.register(research_spec({"human_proxy": ["research_analyst"], "research_analyst": ["data_validator"]},
+                                 ["data_validator", "strategy_advisor"]))
+    manager = inner_team(server.config_list(), broker, specs=specs)
+    manager.max_round = 6
+    digest = manager.execute_workflow("Check the widget data")
+    assert digest.stop_reason == "terminal"
+    assert digest.rounds == 2 and digest.rounds_saved == 3
+
+
+def test_speaker_graph_hands_over_without_the_manager_and_counts_saved_calls(server, broker):
+    metrics = som.WorkflowMetrics()
+    manager = inner_team(server.config_list(), broker, metrics=metrics)
+    events = []
+    digest = manager.execute_workflow("Segment the widget market", on_event=events.append)
+
+    speakers = [event.agent for event in events if event.kind == "message"]
+    assert speakers == ["Research_Team_Human", "Research_Analyst", "Data_Validator", "Strategy_Advisor"]
+    # Every agent call went to a team member: the graph made each selection without the manager
+    assert server.requests == 3
+    saved = metrics.summary()["Research_Team/chat_manager"]["som_speaker_selections_saved_total"]
+    assert saved == 3 and digest.rounds_saved == 0
+
+
+def test_async_pipeline_parks_gates_without_blocking_threads(server, monkeypatch):
+    approvals = som.ApprovalBroker(default_timeout=30.0)
+    monkeypatch.setattr(approvals, "request", lambda *args, **kwargs: pytest.fail("blocking gate in an async pipeline"))
+    society = som.SoMArchitecture(server.config_list(), approval_broker=approvals,
+                                  termination=som.TerminationPolicy.disabled())
+    tasks = {"Research_Team": "Size the widget market", "Development_Team": "Plan the widget build"}
+
+    async def run():
+        pipeline = som.asyncio.ensure_future(society.a_run_pipeline(tasks, "Combine the widget plans"))
+        most_parked = 0
+        while not pipeline.done():
+            parked = approvals.pending()
+            most_parked = max(most_parked, len(parked))
+            # Decide only once both inner teams wait at their gates, or the coordination gate does
+            if len(parked) == 2 or any(gate["team"] == "Outer_Team" for gate in parked):
+                for gate in parked:
+                    approvals.submit(gate["gate_id"], "APPROVE")
+            await som.asyncio.sleep(0.01)
+        return most_parked, await pipeline
+
+    most_parked, outcome = som.asyncio.run(run())
+    assert most_parked == 2
+    assert {result["status"] for result in outcome["inner_teams"].values()} == {"completed"}
+    assert outcome["coordination"]["status"] == "completed"
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_failed_chat_resumes_from_its_last_message(workdir, broker, mode):
+    # Every second request fails: the validator's first reply and the advisor's first reply
+    flaky = FakeLLMServer(completion_tokens=8, error_every=2).start()
+    try:
+        config_list = [dict(flaky.config_list()[0], max_retries=0)]
+        manager = inner_team(config_list, broker, max_retries=2)
+        events = []
+        if mode == "sync":
+            digest = manager.execute_workflow("Estimate widget churn", on_event=events.append)
+        else:
+            digest = som.asyncio.run(manager.a_execute_workflow("Estimate widget churn", on_event=events.append))
+    finally:
+        flaky.stop()
+    speakers = [event.agent for event in events if event.kind == "message"]
+    assert speakers == ["Research_Team_Human", "Research_Analyst", "Data_Validator", "Strategy_Advisor"]
+    assert [event.round for event in events if event.kind == "retry"] == [2, 3]
+    assert digest.stop_reason != "error" and digest.rounds == 3
+    assert flaky.requests == 5
+
+
+RESUME_WORKER = """
+import os, sys
+sys.path.insert(0, {root!r})
+import som_architecture as som
+
+def crash_on_validator(event):
+    if event.kind == "message" and event.agent == "Data_Validator":
+        os._exit(3)
+
+broker = som.ApprovalBroker(default_timeout=5.0)
+broker.add_rule(r".*", "MODIFY continue with the plan")
+manager = som.InnerTeamManager("Research_Team", {config_list!r}, registry=som.TeamRegistry(),
+                               approval_broker=broker, max_round=4, termination=som.TerminationPolicy.disabled(),
+                               checkpoints=som.CheckpointStore({path!r}))
+manager.execute_workflow("Audit the widget forecast", on_event=crash_on_validator)
+"""
+
+
+def test_chat_killed_mid_run_resumes_in_another_process(server, broker, workdir):
+    import subprocess
+
+    # The validator's reply is lost with the worker, so it is requested again
+    config_list = server.config_list()
+    path = str(workdir / "checkpoints.db")
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    worker = RESUME_WORKER.format(root=root, config_list=config_list, path=path)
+    crashed = subprocess.run([sys.executable, "-c", worker], capture_output=True, timeout=120)
+    assert crashed.returncode == 3, crashed.stderr.decode()[-2000:]
+    assert server.requests == 2
+
+    store = som.CheckpointStore(path)
+    [interrupted] = store.unfinished()
+    saved = store.load(interrupted["key"])["messages"]
+    assert [message["name"] for message in saved] == ["Research_Team_Human", "Research_Analyst"]
+
+    manager = inner_team(config_list, broker, checkpoints=store)
+    events = []
+    digest = manager.execute_workflow("Audit the widget forecast", on_event=events.append)
+    # The opener and the analyst's reply come from the checkpoint; only the rest is run again
+    assert [event.agent for event in events if event.kind == "message"] == ["Data_Validator", "Strategy_Advisor"]
+    assert server.requests == 4
+    assert digest.rounds == 3 and digest.stop_reason != "error"
+    assert saved[1]["content"][:40] in "\n".join(digest.key_findings)
+    assert store.unfinished() == []
+
+
+@pytest.mark.parametrize("kind", ["inner", "outer"])
+def test_leased_team_is_reused_with_a_clean_history(server, broker, kind):
+    registry = som.TeamRegistry()
+    options = dict(registry=registry, approval_broker=broker, max_round=4,
+                   termination=som.TerminationPolicy.disabled())
+    if kind == "inner":
+        manager = som.InnerTeamManager("Research_Team", server.config_list(), **options)
+        run = manager.execute_workflow
+    else:
+        manager = som.OuterTeamManager(server.config_list(), **options)
+        run = manager.execute_coordination
+
+    first = run("Size the widget market")
+    agents = dict(manager.agents)
+    second = run("Rank widget suppliers")
+    assert registry.stats()["builds"] == 1 and registry.stats()["reuses"] == 1
+    assert manager.agents == agents
+    assert first.rounds == second.rounds == 3
+    for agent in agents.values():
+        history = json.dumps(list(agent.chat_messages.values()), default=str)
+        assert "Size the widget market" not in history and "Rank widget suppliers" in history
+
+
+def test_metrics_export_prometheus_histograms_and_trace_files(server, broker, workdir):
+    metrics = som.WorkflowMetrics()
+    inner_team(server.config_list(), broker, metrics=metrics).execute_workflow("Price the widget range")
+
+    exposition = metrics.to_prometheus()
+    assert "# TYPE som_llm_call_seconds histogram" in exposition
+    assert "# TYPE som_completion_tokens_total counter" in exposition
+    calls = [line for line in exposition.splitlines() if line.startswith("som_llm_call_seconds_count{")]
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in calls) == server.requests
+    for line in exposition.splitlines():
+        if line.startswith("som_llm_call_seconds_bucket{") and 'le="+Inf"' in line:
+            assert 'team="Research_Team"' in line
+
+    metrics.write_trace(str(workdir / "trace.json"))
+    trace = json.loads((workdir / "trace.json").read_text())["traceEvents"]
+    llm_calls = [event for event in trace if event["cat"] == "llm_call"]
+    assert len(llm_calls) == server.requests
+    assert all(event["ph"] == "X" and event["dur"] > 0 and event["pid"] == "Research_Team" for event in llm_calls)
+
+    metrics.write_collapsed(str(workdir / "stacks.folded"))
+    stacks = dict(line.rsplit(" ", 1) for line in (workdir / "stacks.folded").read_text().splitlines())
+    assert "Research_Team;Research_Analyst;llm_call" in stacks
+    assert all(int(micros) >= 0 for micros in stacks.values())
+
+
+def test_team_digest_is_size_bounded_whatever_the_chat_length():
+    messages = [{"name": "Research_Team_Human", "content": "Plan the widget launch"}]
+    for i in range(30):
+        messages.append({"name": f"Agent_{i % 10}", "content": f"Finding {i}: " + "widgets " * 500})
+        messages.append({"name": "Research_Team_Human", "content": "MODIFY narrow it down " * 50})
+    digest = som.TeamDigest.from_chat("Research_Team", "Plan the widget launch", messages, "Research_Team_Human",
+                                      {"prompt_tokens": 900, "completion_tokens": 100}, 1.5, "approve", 80)
+
+    assert digest.decision == "MODIFY" and digest.rounds == 60 and digest.rounds_saved == 19
+    assert len(digest.key_findings) == som.TeamDigest.MAX_FINDINGS
+    assert all(len(finding) <= len("Agent_0: ") + som.TeamDigest.FINDING_CHARS for finding in digest.key_findings)
+    # The latest contribution of each agent wins: Agent_9 spoke last, so its reply is the final output
+    assert digest.final_output.startswith("Finding 29:")
+    assert len(digest.final_output) <= som.TeamDigest.OUTPUT_CHARS
+    assert digest.key_findings[-1].startswith("Agent_8: Finding 28:")
+    assert len(digest.render()) <= som.TeamDigest.RENDER_CHARS
+    assert len(digest.render(limit=300)) <= 300
+    assert json.loads(json.dumps(digest.to_dict()))["decision"] == "MODIFY"
+
+
+def test_coordination_prompt_carries_the_inner_team_digests(server, broker):
+    research = inner_team(server.config_list(), broker).execute_workflow("Size the widget market")
+    outer = som.OuterTeamManager(server.config_list(), registry=som.TeamRegistry(), approval_broker=broker,
+                                 max_round=2, termination=som.TerminationPolicy.disabled())
+    events = []
+    outer.execute_coordination("Combine the widget plans", {"Research_Team": research, "Development_Team": None},
+                               on_event=events.append)
+
+    opener = next(event for event in events if event.kind == "message")
+    assert research.render() in opener.content
+    assert "Development_Team" not in opener.content
+
+
+AUDIT_SPEC_YAML = """
+teams:
+  audit:
+    name_patterns: ["Audit"]
+    gate: lead
+    agents:
+      lead:
+        kind: human
+        name: "{team_name}_Lead"
+        system_message: "You approve the {team_name} findings."
+      auditor:
+        name: Auditor
+        system_message: "You audit widget suppliers."
+    speaker_graph:
+      lead: [auditor]
+      auditor: [lead]
+"""
+
+
+def test_team_specs_load_from_yaml_and_json_and_resolve_by_name(server, workdir):
+    pytest.importorskip("yaml")
+    (workdir / "audit.yaml").write_text(AUDIT_SPEC_YAML)
+    (workdir / "default.json").write_text(json.dumps({"default_team_type": "audit"}))
+    specs = som.TeamSpecRegistry([som.TeamSpecRegistry.DEFAULT_PATH, str(workdir / "audit.yaml"),
+                                  str(workdir / "default.json")])
+
+    assert specs.resolve("Audit_Team").team_type == "audit"
+    assert specs.resolve("Research_Team").team_type == "research"
+    assert specs.resolve("Ops_Team").team_type == "audit"
+    agents = specs.get("audit").build_agents("Audit_Team", server.config_list(), specs)
+    assert agents["lead"].name == "Audit_Team_Lead"
+    assert agents["lead"].system_message == "You approve the Audit_Team findings."
+    assert agents["auditor"].name == "Auditor"
+
+
+def test_team_spec_validation_reports_every_problem(workdir):
+    agents = {"lead": {"kind": "robot", "name": "Lead", "system_message": "Lead"},
+              "auditor": {"name": "Auditor"}}
+    with pytest.raises(ValueError) as error:
+        som.TeamSpec.from_dict("audit", {"agents": agents, "gate": "lead", "speaker_graph": {"lead": ["ghost"]}})
+    for problem in ("unknown kind 'robot'", "'auditor' needs a name and a system_message",
+                    "gate 'lead' must be a human agent role", "unknown role 'ghost'"):
+        assert problem in str(error.value)
+    with pytest.raises(ValueError, match="Invalid spec for team type 'audit'"):
+        som.TeamSpec.from_dict("audit", {"agents": agents})
+
+    # A file with a nesting cycle is rejected; specs loaded before it stay usable
+    team = {"kind": "team", "name": "Nested", "system_message": ""}
+    human = {"kind": "human", "name": "Lead", "system_message": "Lead"}
+    cyclic = {"teams": {kind: {"gate": "lead", "agents": {"lead": human, "nested": dict(team, team_type=other)}}
+                        for kind, other in (("alpha", "beta"), ("beta", "alpha"))}}
+    (workdir / "cyclic.json").write_text(json.dumps(cyclic))
+    specs = som.TeamSpecRegistry([som.TeamSpecRegistry.DEFAULT_PATH])
+    with pytest.raises(ValueError, match="nest cyclically"):
+        specs.load(str(workdir / "cyclic.json"))
+    assert "alpha" not in specs.team_types() and specs.get("research").team_type == "research"
+
+
+def test_team_specs_are_read_and_built_only_when_used(server, broker, workdir):
+    specs = som.TeamSpecRegistry([str(workdir / "teams.json")])
+    manager = inner_team(server.config_list(), broker, specs=specs, team_type="research")
+    assert manager.agents == {}
+
+    (workdir / "teams.json").write_text(json.dumps({"teams": {"research": {
+        "name_patterns": ["Research"], "gate": "human_proxy", "speaker_graph": {},
+        "agents": {role: {"kind": kind, "name": name, "system_message": message}
+                   for role, (kind, name, message, _) in som.team_specs.get("research").agents.items()}}}}))
+    manager.execute_workflow("Audit widget suppliers")
+    assert set(manager.agents) == {"human_proxy", "research_analyst", "data_validator", "strategy_advisor"}
+
+
+@pytest.fixture
+def offline_token_count(monkeypatch):
+    """Streamed replies are counted with tiktoken, which would download its encodings"""
+    import autogen.oai.client
+
+    monkeypatch.setattr(autogen.oai.client, "count_token", lambda text, model="": len(str(text).split()))
+
+
+def test_stream_workflow_yields_rounds_and_chunks_of_each_message(server, broker, offline_token_count):
+    manager = inner_team(server.config_list(), broker)
+
+    async def collect():
+        return [event async for event in manager.stream_workflow("Plan the widget launch")]
+
+    events = som.asyncio.run(collect())
+    assert events[0].kind == "workflow_start" and events[-1].kind == "workflow_end"
+    rounds = [event for event in events if event.kind == "round"]
+    assert [(event.agent, event.round) for event in rounds] == [
+        ("Research_Analyst", 1), ("Data_Validator", 2), ("Strategy_Advisor", 3)]
+
+    for announced in rounds:
+        chunks = [event for event in events if event.kind == "chunk" and event.round == announced.round]
+        [message] = [event for event in events if event.kind == "message" and event.round == announced.round]
+        assert len(chunks) > 1 and {chunk.agent for chunk in chunks} == {announced.agent}
+        # Chunks arrive between their round boundary and the complete message
+        assert events.index(announced) < events.index(chunks[0]) < events.index(message)
+        assert "".join(chunk.content for chunk in chunks) == message.content
+    assert events[-1].data["digest"].final_output == events[-2].content
+
+
+def test_closing_the_stream_cancels_the_chat(workdir, broker, offline_token_count):
+    slow = FakeLLMServer(latency=0.2, completion_tokens=8).start()
+    try:
+        manager = inner_team(slow.config_list(), broker)
+
+        async def first_chunk():
+            stream = manager.stream_workflow("Plan the widget launch")
+            async for event in stream:
+                if event.kind == "chunk":
+                    break
+            await stream.aclose()
+            return event
+
+        event = som.asyncio.run(first_chunk())
+    finally:
+        slow.stop()
+    assert event.agent == "Research_Analyst"
+    # Uncancelled, the chat makes three calls; only the one in flight when the stream closes may finish
+    assert slow.requests <= 2